@@ -14,7 +14,8 @@ import json  # Config file
 import hashlib  # file hash (trend de-dup)
 import tempfile  # SAFEGUARD: fallback dirs
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, Dict, List, Union
+from typing import Any, Callable, Optional, Tuple, Dict, List, Union
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
@@ -58,6 +59,13 @@ except Exception:
     GridUpdateMode = None
     JsCode = None
 
+# Try python-calamine (Rust xlsx reader behind pandas' engine="calamine"); openpyxl is the fallback
+try:
+    import python_calamine  # noqa: F401
+    _CALAMINE_AVAILABLE = True
+except Exception:
+    _CALAMINE_AVAILABLE = False
+
 # ---------- THEME COLORS ----------
 BLUE = "#1f77b4"  # Plotly classic blue
 RED  = "#d62728"  # Plotly classic red
@@ -85,10 +93,24 @@ def _rerun():
         except Exception:
             pass
 
+# ---------- UTIL: fragment wrapper ----------
+# st.fragment (1.37+) / st.experimental_fragment (1.33+): widgets inside rerun only their block.
+# Older Streamlit just runs the function as part of the page.
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
 # ---------- Lottie helpers ----------
+@st.cache_resource(show_spinner=False)
+def _http_session() -> requests.Session:
+    """One pooled HTTP session per server process, so banner fetches reuse connections."""
+    return requests.Session()
+
+# Fetched once per hour per URL, not on every rerun (a miss is cached too, so an offline
+# host doesn't pay four request timeouts on each widget interaction). cache_resource hands back the
+# same parsed JSON object instead of unpickling a copy of the animation on every rerun; st_lottie only reads it.
+@st.cache_resource(ttl=3600, show_spinner=False)
 def _load_lottie(url: str):
     try:
-        r = requests.get(url, timeout=8)
+        r = _http_session().get(url, timeout=8)
         if r.status_code == 200:
             return r.json()
     except Exception:
@@ -125,9 +147,9 @@ Fast, visual lookups for **Empty**, **Partial**, **Full**, **Damages**, and **Mi
 show_banner()
 
 # ===== SAFEGUARD: robust path resolution & file append =====
-def _resolve_writable_dir(preferred: Optional[str], purpose: str = "logs") -> Tuple[str, bool]:
+def _resolve_writable_dir(preferred: Optional[str], purpose: str = "logs", use_env: bool = True) -> Tuple[str, bool]:
     candidates = []
-    env_override = os.environ.get("BIN_HELPER_LOG_DIR")
+    env_override = os.environ.get("BIN_HELPER_LOG_DIR") if use_env else None
     if env_override:
         candidates.append(env_override)
     if preferred:
@@ -156,6 +178,10 @@ def _resolve_writable_dir(preferred: Optional[str], purpose: str = "logs") -> Tu
         return d, True
 
 def _safe_append_csv(path: str, header: List[str], row: List) -> Tuple[bool, str, str]:
+    return _safe_append_csv_rows(path, header, [row])
+
+def _safe_append_csv_rows(path: str, header: List[str], rows: List[List]) -> Tuple[bool, str, str]:
+    """Append several rows with one open/writerows (batch logging), header first if the file is new."""
     def _try_write(p: str) -> Tuple[bool, str]:
         os.makedirs(os.path.dirname(p), exist_ok=True)
         file_exists = os.path.isfile(p)
@@ -163,7 +189,7 @@ def _safe_append_csv(path: str, header: List[str], row: List) -> Tuple[bool, str
             w = csv.writer(f)
             if not file_exists:
                 w.writerow(header)
-            w.writerow(row)
+            w.writerows(rows)
         return True, p
     try:
         ok, used = _try_write(path)
@@ -181,24 +207,48 @@ def _safe_append_csv(path: str, header: List[str], row: List) -> Tuple[bool, str
 PREFERRED_LOG_DIR = r"C:\Users\carlos.pacheco.MYA-LOGISTICS\OneDrive - JT Logistics\bin-helper\logs"
 LOG_DIR, LOG_FALLBACK_USED = _resolve_writable_dir(PREFERRED_LOG_DIR, purpose="logs")
 DATA_DIR, DATA_FALLBACK_USED = _resolve_writable_dir(os.path.join(os.path.dirname(LOG_DIR), "data"), purpose="data")
+# App-local sheet cache: never the (synced / env-overridden) log folder, so pruning only ever sees its own copies
+CACHE_DIR, _ = _resolve_writable_dir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"),
+                                     purpose="cache", use_env=False)
 CONFIG_FILE = os.path.join(LOG_DIR, "config.json")
 resolved_file = os.path.join(LOG_DIR, "resolved_discrepancies.csv")
 TRENDS_FILE = os.path.join(LOG_DIR, "trend_history.csv")
 DEFAULT_INVENTORY_FILE = "ON_HAND_INVENTORY.xlsx"
 DEFAULT_MASTER_FILE = "Empty Bin Formula.xlsx"
 
+# ===== Session memos =====
+_MEMO_PREFIX = "_memo_"
+
+def _session_memo(name: str, key, build: Callable[[], Any]):
+    """
+    build(), kept in session_state and redone only when `key` changes. Reruns get the same object back
+    (a st.cache_data hit would unpickle a fresh copy every time); callers must not mutate it.
+    """
+    slot = _MEMO_PREFIX + name
+    memo = st.session_state.get(slot)
+    if memo is None or memo[0] != key:
+        memo = (key, build())
+        st.session_state[slot] = memo
+    return memo[1]
+
 # ===== Sidebar =====
 def _clear_cache_and_rerun():
     try:
         st.cache_data.clear()
     except Exception:
         pass
+    # Session memos and Parquet sheet copies too, so the workbooks are really re-read
+    for k in [k for k in st.session_state.keys() if str(k).startswith(_MEMO_PREFIX)]:
+        del st.session_state[k]
+    _prune_parquet_cache(keep=0)
     st.session_state["kpi_run_id"] = datetime.now().strftime("%H%M%S%f")
     _rerun()
 
+_UNSAFE_NAME_RE = re.compile(r"[^\w.\-]+")
+
 def _save_uploaded_inventory(uploaded) -> str:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_name = re.sub(r"[^\w.\-]+", "_", uploaded.name)
+    safe_name = _UNSAFE_NAME_RE.sub("_", uploaded.name)
     out_path = os.path.join(DATA_DIR, f"{ts}__{safe_name}")
     with open(out_path, "wb") as f:
         f.write(uploaded.getbuffer())
@@ -214,16 +264,37 @@ def _file_md5(path: str) -> str:
     except Exception:
         return ""
 
+def _file_sig(path: str) -> str:
+    """Cheap identity for a data file (path + mtime + size) used as a cache key."""
+    try:
+        stt = os.stat(path)
+        return f"{os.path.abspath(path)}:{stt.st_mtime_ns}:{stt.st_size}"
+    except Exception:
+        return str(path)
+
+def _file_md5_memo(path: str) -> str:
+    """MD5 of a file, re-hashed only when its mtime/size signature changes (memo lives in session_state)."""
+    sig = _file_sig(path)
+    memo = st.session_state.setdefault(_MEMO_PREFIX + "md5", {})
+    hit = memo.get(path)
+    if hit is None or hit[0] != sig:
+        hit = memo[path] = (sig, _file_md5(path))
+    return hit[1]
+
 with st.sidebar:
     st.subheader("📦 Upload Inventory")
     up = st.file_uploader("Upload new ON_HAND_INVENTORY.xlsx", type=["xlsx"], key="inv_upload")
     auto_record = st.toggle("Auto-record trend on new upload (recommended)", value=True, key="auto_record_trend")
     if up is not None:
-        saved_path = _save_uploaded_inventory(up)
-        st.session_state.inventory_path = saved_path
-        st.success(f"Saved: {os.path.basename(saved_path)}")
-        if auto_record:
-            st.session_state["pending_trend_record"] = True
+        # The uploader keeps returning the same file on every rerun; only a new upload (by content)
+        # is saved, so reruns keep the same path/signature and hit the cached sheets.
+        up_md5 = hashlib.md5(up.getbuffer()).hexdigest()
+        if st.session_state.get("inv_upload_md5") != up_md5 or not st.session_state.inventory_path:
+            st.session_state.inventory_path = _save_uploaded_inventory(up)
+            st.session_state["inv_upload_md5"] = up_md5
+            if auto_record:
+                st.session_state["pending_trend_record"] = True
+        st.success(f"Saved: {os.path.basename(st.session_state.inventory_path)}")
 
     st.subheader("⚡ Performance")
     st.toggle("Fast tables (limit to 1000 rows)", value=False, key="fast_tables")
@@ -260,24 +331,95 @@ if auto_interval:
         st.session_state["pending_trend_record"] = True
 
 # ===== Cached Loader =====
-@st.cache_data(ttl=120, show_spinner=False)
-def _load_excel(path: str, sheet_name=0):
+# pandas' openpyxl reader already opens workbooks read_only/data_only/keep_links=False
+def _read_excel(path: str, sheet_name=0) -> pd.DataFrame:
+    if _CALAMINE_AVAILABLE:
+        try:
+            return pd.read_excel(path, sheet_name=sheet_name, engine="calamine")
+        except (ValueError, ImportError):
+            pass  # pandas < 2.2 has no calamine engine; other read errors (corrupt/protected file) propagate
     return pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl")
 
+PARQUET_CACHE_KEEP = 16  # most recently used sheet copies kept in CACHE_DIR
+_PARQUET_CACHE_RE = re.compile(r"[0-9a-f]{32}\.[0-9a-f]{8}\.parquet")  # <content md5>.<sheet tag>.parquet
+
+def _parquet_cache_path(path: str, sheet_name) -> str:
+    """
+    Parquet copy for this workbook *content* and sheet: identical bytes share one copy, whatever the file
+    is called (a re-upload under a new timestamped name, a fresh checkout with new mtimes). "" if unreadable.
+    """
+    digest = _file_md5(path)
+    if not digest:
+        return ""
+    tag = hashlib.md5(str(sheet_name).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(CACHE_DIR, f"{digest}.{tag}.parquet")
+
+def _prune_parquet_cache(keep: int = PARQUET_CACHE_KEEP):
+    try:
+        copies = [os.path.join(CACHE_DIR, n) for n in os.listdir(CACHE_DIR) if _PARQUET_CACHE_RE.fullmatch(n)]
+        copies.sort(key=os.path.getmtime, reverse=True)
+        for stale in copies[keep:]:
+            os.remove(stale)
+    except OSError:
+        pass
+
+# In-memory and keyed on the file signature (shared by every session in this process); the Parquet copy
+# below is the only on-disk layer and is what survives a restart.
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_excel(path: str, file_sig: str, sheet_name=0):
+    """
+    Read a sheet, going through a Parquet copy in CACHE_DIR keyed by the workbook's content hash
+    (hashed only here, i.e. once per new file signature). Sheets Parquet can't hold
+    (e.g., mixed int/str columns) are simply read from Excel each time.
+    """
+    cache_path = _parquet_cache_path(path, sheet_name)
+    if not cache_path:
+        return _read_excel(path, sheet_name)
+    if os.path.isfile(cache_path):
+        try:
+            df = pd.read_parquet(cache_path)
+            os.utime(cache_path)  # mark as recently used for pruning
+            return df
+        except Exception:
+            pass
+    df = _read_excel(path, sheet_name)
+    try:
+        df.to_parquet(cache_path, compression="zstd")
+    except Exception:
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+        return df
+    _prune_parquet_cache()
+    return df
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _list_sheets(path: str, file_sig: str) -> List[str]:
+    """Sheet names of a workbook (read-only open), cached per file signature."""
+    try:
+        if _CALAMINE_AVAILABLE:
+            try:
+                with pd.ExcelFile(path, engine="calamine") as xl:
+                    return [str(n) for n in xl.sheet_names]
+            except (ValueError, ImportError):
+                pass  # same fallback as _read_excel
+        with pd.ExcelFile(path, engine="openpyxl") as xl:
+            return [str(n) for n in xl.sheet_names]
+    except Exception:
+        return []
+
 inventory_file = st.session_state.inventory_path or DEFAULT_INVENTORY_FILE
 master_file = DEFAULT_MASTER_FILE
-try:
-    inventory_df = _load_excel(inventory_file)
-except Exception as e:
-    st.error(f"Failed to load inventory file: {inventory_file}. Error: {e}")
-    st.stop()
-try:
-    master_df = _load_excel(master_file, sheet_name="Master Locations")
-except Exception:
-    master_df = _load_excel(master_file)
+# Pick the sheet up front: a failed sheet lookup is not cached, so try/except would reopen the workbook every rerun
+MASTER_SHEET = "Master Locations" if "Master Locations" in _list_sheets(master_file, _file_sig(master_file)) else 0
+if MASTER_SHEET == 0:
     st.warning("Sheet 'Master Locations' not found; used the first sheet instead.")
 
 # ===== Normalization =====
+_INT_LIKE_RE = re.compile(r"\d+(\.0+)?")
+_NON_DIGIT_RE = re.compile(r"\D")
+
 def normalize_lot_number(val) -> str:
     """Numeric-only, strip non-digits and leading zeros; keep empty if none."""
     try:
@@ -286,13 +428,23 @@ def normalize_lot_number(val) -> str:
     except Exception:
         pass
     s = str(val).strip()
-    if re.fullmatch(r"\d+(\.0+)?", s):
+    if _INT_LIKE_RE.fullmatch(s):
         s = s.split(".")[0]
     else:
-        s = re.sub(r"\D", "", s)
+        s = _NON_DIGIT_RE.sub("", s)
     s = s.lstrip("0")
     return s if s else ""
 
+def normalize_lot_series(s: pd.Series) -> pd.Series:
+    """normalize_lot_number over a whole column with vectorized string ops (same result for ASCII input)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Categorical.map already runs once per category
+        return s.map(normalize_lot_number)
+    txt = s.astype(str).str.strip()
+    int_like = txt.str.fullmatch(r"\d+(\.0+)?", na=False).to_numpy()
+    out = txt.str.replace(r"\D", "", regex=True).where(~int_like, txt.str.split(".", n=1).str[0])
+    return out.str.lstrip("0").where(s.notna().to_numpy(), "")
+
 def normalize_pallet_id(val) -> str:
     """
     Preserve alphanumeric Pallet IDs (e.g., 'JTL00496').
@@ -305,30 +457,74 @@ def normalize_pallet_id(val) -> str:
     except Exception:
         pass
     s = str(val).strip()
-    if re.fullmatch(r"\d+(\.0+)?", s):
+    if _INT_LIKE_RE.fullmatch(s):
         s = s.split(".")[0]
     return s
+
+def normalize_pallet_series(s: pd.Series) -> pd.Series:
+    """normalize_pallet_id over a whole column with vectorized string ops (same result for ASCII input)."""
+    txt = s.astype(str).str.strip()
+    int_like = txt.str.fullmatch(r"\d+(\.0+)?", na=False).to_numpy()
+    return txt.where(~int_like, txt.str.split(".", n=1).str[0]).where(s.notna().to_numpy(), "")
+
 def ensure_numeric_col(df: pd.DataFrame, col: str, default: Union[float, int] = 0):
     if col in df.columns:
         df[col] = pd.to_numeric(df[col], errors="coerce").fillna(default)
     else:
         df[col] = default
 
-ensure_numeric_col(inventory_df, "Qty", 0)
-ensure_numeric_col(inventory_df, "PalletCount", 0)
-for c in ["LocationName", "PalletId", "CustomerLotReference", "WarehouseSku"]:
-    if c not in inventory_df.columns:
-        inventory_df[c] = ""
-inventory_df["LocationName"] = inventory_df["LocationName"].astype(str)
-inventory_df["PalletId"] = inventory_df["PalletId"].apply(normalize_pallet_id)  # keep alphanumeric
-inventory_df["CustomerLotReference"] = inventory_df["CustomerLotReference"].apply(normalize_lot_number)
+def _prepare_inventory(df: pd.DataFrame) -> pd.DataFrame:
+    ensure_numeric_col(df, "Qty", 0)
+    ensure_numeric_col(df, "PalletCount", 0)
+    # Per-pallet counts fit in 32 bits: half the bytes for every compare/sum over them
+    for c in ["Qty", "PalletCount"]:
+        if df[c].dtype == np.int64 and df[c].abs().max() < 2**31:
+            df[c] = df[c].astype(np.int32)
+        elif df[c].dtype == np.float64:
+            df[c] = df[c].astype(np.float32)
+    for c in ["LocationName", "PalletId", "CustomerLotReference", "WarehouseSku"]:
+        if c not in df.columns:
+            df[c] = ""
+    df["LocationName"] = df["LocationName"].astype(str)
+    df["PalletId"] = normalize_pallet_series(df["PalletId"])  # keep alphanumeric
+    df["CustomerLotReference"] = normalize_lot_series(df["CustomerLotReference"])
+    # Location/SKU/LOT values repeat heavily; category codes make groupby/isin/drop_duplicates hash ints, not strings.
+    # PalletId stays object (near-unique per row, so categories would not pay off).
+    for c in ["LocationName", "WarehouseSku", "CustomerLotReference"]:
+        df[c] = df[c].astype("category")
+    return df
+
+def _inventory(path: str, file_sig: str) -> pd.DataFrame:
+    """Loaded and normalized inventory, per file signature. Views are built with assign/slices, never in place."""
+    return _session_memo("inventory", file_sig, lambda: _prepare_inventory(_load_excel(path, file_sig)))
 
-# ===== Rules / helpers =====
-def exclude_damage_missing(df: pd.DataFrame) -> pd.DataFrame:
-    return df[~df["LocationName"].str.upper().isin(["DAMAGE", "MISSING", "IBDAMAGE"])].copy()
+try:
+    inventory_df = _inventory(inventory_file, _file_sig(inventory_file))
+except Exception as e:
+    st.error(f"Failed to load inventory file: {inventory_file}. Error: {e}")
+    st.stop()
 
-filtered_inventory_df = exclude_damage_missing(inventory_df)
-occupied_locations = set(filtered_inventory_df["LocationName"].dropna().astype(str).unique())
+# ===== Rules / helpers =====
+DAMAGE_LOCATIONS = ("DAMAGE", "IBDAMAGE")
+MISSING_LOCATION = "MISSING"
+
+def _category_mask(s: pd.Series, pred) -> np.ndarray:
+    """Row mask for a string predicate on a categorical: evaluate on the categories once, broadcast via codes."""
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        # Plain column: same idea over its distinct values (NaN kept as a value so it still tests as "nan")
+        codes, uniques = pd.factorize(s, use_na_sentinel=False)
+        return np.asarray(pred(pd.Series(uniques, dtype=object).astype(str)), dtype=bool)[codes]
+    hit = np.asarray(pred(pd.Series(s.cat.categories.astype(str))), dtype=bool)
+    return np.append(hit, False)[s.cat.codes.to_numpy()]  # code -1 (NaN) lands on the trailing False
+
+def _take(df: pd.DataFrame, mask) -> pd.DataFrame:
+    """Rows of df where mask is True, via integer positions (cheaper than a boolean take for small hit counts)."""
+    return df.iloc[np.flatnonzero(np.asarray(mask, dtype=bool))]
+
+def _contains_ci(s: pd.Series, needle: str) -> np.ndarray:
+    """Case-insensitive literal substring mask: upper-case both sides and use the non-regex search path."""
+    needle = str(needle).upper()
+    return _category_mask(s, lambda v: v.str.upper().str.contains(needle, regex=False, na=False))
 
 def extract_master_locations(df: pd.DataFrame) -> set:
     for c in df.columns:
@@ -338,58 +534,136 @@ def extract_master_locations(df: pd.DataFrame) -> set:
     s = df.iloc[:, 0].dropna().astype(str).str.strip()
     return set(s.unique().tolist())
 
-master_locations = extract_master_locations(master_df)
-
-def get_partial_bins(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = exclude_damage_missing(df)
-    s = df2["LocationName"].astype(str)
-    mask = (
-        s.str.endswith("01")
-        & ~s.str.startswith("111")
-        & ~s.str.upper().str.startswith("TUN")
-        & (s.str[0].str.isdigit())
-    )
-    return df2.loc[mask].copy()
+def _master_locations(path: str, file_sig: str, sheet_name) -> set:
+    """Master location set, re-extracted only when the master workbook or sheet changes."""
+    return _session_memo("master_locations", (file_sig, sheet_name),
+                         lambda: extract_master_locations(_load_excel(path, file_sig, sheet_name=sheet_name)))
+
+master_locations = _master_locations(master_file, _file_sig(master_file), MASTER_SHEET)
+
+def _loc_flags(s: pd.Series) -> Dict[str, np.ndarray]:
+    """Prefix/suffix tests on location codes as numpy string ops over one fixed-width array."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Test each location code once, pack the flags into one bit each of a uint8 per category and
+        # broadcast that byte through the category codes in a single gather (NaN -> trailing 0, all False)
+        per_cat = _loc_flags(pd.Series(s.cat.categories))
+        packed = np.zeros(len(s.cat.categories) + 1, dtype=np.uint8)
+        for bit, v in enumerate(per_cat.values()):
+            packed[:-1] |= v.astype(np.uint8) << bit
+        row = packed[s.cat.codes.to_numpy()]
+        return {k: (row & np.uint8(1 << bit)) != 0 for bit, k in enumerate(per_cat)}
+    # fillna: a missing value in a str-dtype column would otherwise collapse the array to '<U1'
+    arr = s.astype(str).fillna("").to_numpy(dtype=str)
+    # Case-insensitive "TUN" prefix on the first three code points as uint32 (| 0x20 folds ASCII case)
+    head = np.ascontiguousarray(arr.astype("U3")).view(np.uint32).reshape(-1, 3) | 0x20
+    return {
+        "ends01": np.char.endswith(arr, "01"),
+        "starts111": np.char.startswith(arr, "111"),
+        "starts_tun": (head[:, 0] == ord("t")) & (head[:, 1] == ord("u")) & (head[:, 2] == ord("n")),
+        "first_digit": np.char.isdigit(arr.astype("U1")),
+        "numeric": np.char.isnumeric(arr),
+    }
 
-def get_full_pallet_bins(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = exclude_damage_missing(df)
-    s = df2["LocationName"].astype(str)
+def _filtered_views(file_sig: str):
+    """
+    Damage/missing masks, the filtered frame, its occupied locations and its location flags, rebuilt only when
+    the inventory file changes. The bin/discrepancy helpers below take this already-filtered frame and its flags.
+    """
+    def build():
+        # Special-location masks from the location categories; filtered/damages/missing views all reuse them
+        is_damage = _category_mask(inventory_df["LocationName"], lambda c: c.str.upper().isin(DAMAGE_LOCATIONS))
+        is_missing = _category_mask(inventory_df["LocationName"], lambda c: c.str.upper().eq(MISSING_LOCATION))
+        filtered = inventory_df[~(is_damage | is_missing)]
+        filtered = filtered.assign(LocationName=filtered["LocationName"].cat.remove_unused_categories())
+        # Unused categories were just dropped, so the categories are exactly the occupied locations (no row scan)
+        occupied = set(filtered["LocationName"].cat.categories.astype(str))
+        # The shared filtered frame is classified by every bin view and by the rack discrepancy scan; flag it once
+        return is_damage, is_missing, filtered, occupied, _loc_flags(filtered["LocationName"])
+    return _session_memo("filtered_views", file_sig, build)
+
+is_damage_loc, is_missing_loc, filtered_inventory_df, occupied_locations, FILTERED_LOC_FLAGS = _filtered_views(
+    _file_sig(inventory_file))
+
+def _master_loc_views(key) -> Tuple[pd.Series, Dict[str, np.ndarray]]:
+    """Master locations as one str Series plus its location flags, rebuilt only when the master set changes."""
+    def build():
+        series = pd.Series(list(master_locations), dtype=str)
+        return series, _loc_flags(series)
+    return _session_memo("master_loc_views", key, build)
+
+MASTER_LOC_SERIES, MASTER_LOC_FLAGS = _master_loc_views((_file_sig(master_file), MASTER_SHEET))
+
+def _partial_mask(f: Dict[str, np.ndarray]) -> np.ndarray:
+    return f["ends01"] & ~f["starts111"] & ~f["starts_tun"] & f["first_digit"]
+
+# The bin/discrepancy helpers take _filtered_views' frame (no damage/missing rows); `flags` is its
+# _loc_flags (computed here when not passed in)
+def get_partial_bins(df: pd.DataFrame, flags: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    f = _loc_flags(df["LocationName"]) if flags is None else flags
+    return _take(df, _partial_mask(f))
+
+def get_full_pallet_bins(df: pd.DataFrame, flags: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    f = _loc_flags(df["LocationName"]) if flags is None else flags
     # Full pallet bins: numeric locations that are (not '...01' OR starts with '111') and Qty between 6 and 15
-    mask = ((~s.str.endswith("01")) | (s.str.startswith("111"))) & s.str.isnumeric() & df2["Qty"].between(6, 15)
-    return df2.loc[mask].copy()
+    mask = (~f["ends01"] | f["starts111"]) & f["numeric"] & df["Qty"].between(6, 15).to_numpy()
+    return df.loc[mask]
 
-def get_empty_partial_bins(master_locs: set, occupied_locs: set) -> pd.DataFrame:
-    series = pd.Series(list(master_locs), dtype=str)
-    mask = (
-        series.str.endswith("01")
-        & ~series.str.startswith("111")
-        & ~series.str.upper().str.startswith("TUN")
-        & (series.str[0].str.isdigit())
-    )
-    partial_candidates = set(series[mask])
-    empty_partial = sorted(partial_candidates - set(occupied_locs))
+def _free_locations(candidates: pd.Series, occupied_locs: set) -> pd.Index:
+    """Sorted candidate locations that are not occupied (Index.difference: one hash pass + a vectorized sort)."""
+    return pd.Index(candidates, dtype=str).difference(pd.Index(list(occupied_locs), dtype=str))
+
+def get_empty_partial_bins(master_locs: pd.Series, occupied_locs: set,
+                           flags: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    f = _loc_flags(master_locs) if flags is None else flags
+    empty_partial = _free_locations(master_locs[_partial_mask(f)], occupied_locs)
     return pd.DataFrame({"LocationName": empty_partial})
 
+def _distinct_count(df: pd.DataFrame, by: str, col: str, name: str, sort: bool = True) -> pd.DataFrame:
+    """
+    Distinct non-null `col` values per `by` (same rows/order as groupby(by, sort=sort)[col].nunique()).
+    Both columns are factorized to int codes and packed into one int64 key per row (by << 32 | col);
+    one flat sort of the packed keys (much cheaper than a two-key lexsort) and a transition test leave each
+    distinct pair once; bincount of the high half counts them.
+    `by` is factorized over every row, so a group whose `col` values are all null still appears (count 0).
+    """
+    by_codes, by_uniques = pd.factorize(df[by], sort=sort)
+    # groupby drops null keys; nunique skips null values
+    keep = (by_codes >= 0) & df[col].notna().to_numpy()
+    col_codes, _ = pd.factorize(df[col][keep])
+    keys = np.sort((by_codes[keep].astype(np.int64) << 32) | col_codes.astype(np.int64))
+    new_pair = np.ones(len(keys), dtype=bool)
+    new_pair[1:] = keys[1:] != keys[:-1]
+    counts = np.bincount(keys[new_pair] >> 32, minlength=len(by_uniques))
+    return pd.DataFrame({by: by_uniques, name: counts})
+
 def _find_multi_pallet_all_racks(df: pd.DataFrame):
-    df2 = exclude_damage_missing(df).copy()
-    df2["LocationName"] = df2["LocationName"].astype(str).str.strip()
-    s = df2["LocationName"].astype(str)
-    rack_df = df2[s.str.isnumeric()].copy()
+    loc = df["LocationName"]
+    if isinstance(loc.dtype, pd.CategoricalDtype):
+        # Strip/test each location code once; rack rows are picked and relabelled through the category codes
+        cats = pd.Series(loc.cat.categories.astype(str)).str.strip()
+        codes = loc.cat.codes.to_numpy()
+        keep = np.append(cats.str.isnumeric().to_numpy(dtype=bool), False)[codes]
+        rack_df = _take(df, keep)
+        rack_df = rack_df.assign(LocationName=cats.iloc[codes[keep]].set_axis(rack_df.index))
+    else:
+        df = df.assign(LocationName=loc.astype(str).str.strip())
+        rack_df = df[df["LocationName"].str.isnumeric()]
     if rack_df.empty:
         return pd.DataFrame(columns=["LocationName", "DistinctPallets"]), pd.DataFrame()
-    grp = (rack_df.groupby("LocationName")["PalletId"].nunique(dropna=True).reset_index(name="DistinctPallets"))
+    grp = _distinct_count(rack_df, "LocationName", "PalletId", "DistinctPallets", sort=False)
     viol = grp[grp["DistinctPallets"] > 1]
     if viol.empty:
         return grp.iloc[0:0], pd.DataFrame()
     viol_locs = set(viol["LocationName"])
-    details = rack_df[rack_df["LocationName"].isin(viol_locs)].copy()
-    locs = details["LocationName"].astype(str)
-    details["Issue"] = [
-        "Multiple pallets in partial bin" if (loc.endswith("01") and not loc.startswith("111"))
-        else "Multiple pallets in rack location"
-        for loc in locs
-    ]
-    details = details.merge(viol, on="LocationName", how="left")
+    details = rack_df[rack_df["LocationName"].isin(viol_locs)]
+    f = _loc_flags(details["LocationName"])
+    details = details.assign(Issue=np.where(
+        f["ends01"] & ~f["starts111"], "Multiple pallets in partial bin", "Multiple pallets in rack location"
+    ))
+    # viol is one row per location: align its counts by index lookup instead of a hash merge
+    details = details.assign(
+        DistinctPallets=details["LocationName"].map(viol.set_index("LocationName")["DistinctPallets"])
+    ).reset_index(drop=True)
     return viol.sort_values("DistinctPallets", ascending=False), details
 
 # ===== Config: bulk capacity =====
@@ -416,38 +690,51 @@ def save_config(cfg: dict):
 _config = load_config()
 bulk_rules = _config.get("bulk_rules", DEFAULT_BULK_RULES).copy()
 
+def _data_key() -> str:
+    """Cache key for derived tables: the loaded inventory file's signature plus the bulk rules."""
+    return f"{_file_sig(inventory_file)}|{json.dumps(bulk_rules, sort_keys=True)}"
+
 # ===== Build views (computed from bulk_rules) =====
-def build_bulk_views():
-    bulk_locations = []
-    empty_bulk_locations = []
-    location_counts = filtered_inventory_df.groupby("LocationName").size().reset_index(name="PalletCount")
-    for _, row in location_counts.iterrows():
-        location = str(row["LocationName"])
-        count = int(row["PalletCount"])
-        if not location:
-            continue
-        zone = location[0].upper()
-        if zone in bulk_rules:
-            max_allowed = bulk_rules[zone]
-            empty_slots = max_allowed - count
-            bulk_locations.append({
-                "LocationName": location, "Zone": zone,
-                "PalletCount": count, "MaxAllowed": max_allowed,
-                "EmptySlots": max(0, empty_slots)
-            })
-            if empty_slots > 0:
-                empty_bulk_locations.append({"LocationName": location, "Zone": zone, "EmptySlots": empty_slots})
-    return pd.DataFrame(bulk_locations), pd.DataFrame(empty_bulk_locations)
-
-empty_bins_view_df = pd.DataFrame({
-    "LocationName": sorted([loc for loc in master_locations if (loc not in occupied_locations and not str(loc).endswith("01"))])
-})
-full_pallet_bins_df = get_full_pallet_bins(filtered_inventory_df)
-partial_bins_df = get_partial_bins(filtered_inventory_df)
-empty_partial_bins_df = get_empty_partial_bins(master_locations, occupied_locations)
-damages_df = inventory_df[inventory_df["LocationName"].str.upper().isin(["DAMAGE", "IBDAMAGE"])].copy()
-missing_df = inventory_df[inventory_df["LocationName"].str.upper() == "MISSING"].copy()
-bulk_locations_df, empty_bulk_locations_df = build_bulk_views()
+def build_bulk_views(df: pd.DataFrame, rules: Dict[str, int]):
+    # Pallets per location, then the zone rule (first letter) applied column-wise to every location at once
+    counts = df.groupby("LocationName", observed=True).size()
+    locs = pd.Series(counts.index.astype(str))
+    zones = locs.str[0].str.upper()
+    keep = zones.isin(list(rules.keys())).to_numpy()
+    if not keep.any():
+        return pd.DataFrame(), pd.DataFrame()
+    zones = zones[keep].reset_index(drop=True)
+    count = counts.to_numpy()[keep].astype(np.int64)
+    max_allowed = zones.map(rules)
+    empty_slots = max_allowed - count
+    bulk = pd.DataFrame({"LocationName": locs[keep].reset_index(drop=True), "Zone": zones, "PalletCount": count,
+                         "MaxAllowed": max_allowed, "EmptySlots": empty_slots.clip(lower=0)})
+    has_room = (empty_slots > 0).to_numpy()
+    empty_bulk = (pd.DataFrame({"LocationName": bulk["LocationName"][has_room], "Zone": zones[has_room],
+                                "EmptySlots": empty_slots[has_room]}).reset_index(drop=True)
+                  if has_room.any() else pd.DataFrame())
+    views = (bulk, empty_bulk)
+    # A handful of zone letters across every bulk slot: group/sort on category codes
+    return tuple(v.assign(Zone=v["Zone"].astype("category")) if "Zone" in v.columns else v for v in views)
+
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def _cached_bin_views(data_key: str, master_sig: str, _df: pd.DataFrame, _flags: Dict[str, np.ndarray],
+                      _occupied: set, _master_locs: pd.Series, _master_flags: Dict[str, np.ndarray],
+                      _rules: Dict[str, int]):
+    """KPI tables (empty/full/partial/empty-partial bins, bulk and empty-bulk), rebuilt only when the
+    inventory, the master file or the bulk rules change, not on every widget rerun.
+    data_key covers _df/_flags/_occupied/_rules, master_sig covers _master_locs/_master_flags."""
+    free = _free_locations(_master_locs, _occupied)
+    empty_bins = pd.DataFrame({"LocationName": free[~free.str.endswith("01")]})
+    return (empty_bins, get_full_pallet_bins(_df, _flags), get_partial_bins(_df, _flags),
+            get_empty_partial_bins(_master_locs, _occupied, _master_flags)) + tuple(build_bulk_views(_df, _rules))
+
+(empty_bins_view_df, full_pallet_bins_df, partial_bins_df, empty_partial_bins_df,
+ bulk_locations_df, empty_bulk_locations_df) = _cached_bin_views(
+    _data_key(), _file_sig(master_file), filtered_inventory_df, FILTERED_LOC_FLAGS, occupied_locations,
+    MASTER_LOC_SERIES, MASTER_LOC_FLAGS, bulk_rules)
+damages_df = _take(inventory_df, is_damage_loc)
+missing_df = _take(inventory_df, is_missing_loc)
 # >>> TRENDS-HOOKCALL: BEGIN
 try:
     _trend_auto_hooks()
@@ -461,68 +748,109 @@ CORE_COLS = ["LocationName", "WarehouseSku", "PalletId", "CustomerLotReference",
 def ensure_core(df: pd.DataFrame, include_issue: bool = False) -> pd.DataFrame:
     if df is None or df.empty:
         return pd.DataFrame(columns=CORE_COLS + (["Issue"] if include_issue else []))
-    out = df.copy()
-    for c in CORE_COLS:
-        if c not in out.columns:
-            out[c] = ""
-    if "PalletId" in out.columns:
-        out["PalletId"] = out["PalletId"].apply(normalize_pallet_id)
-    if "CustomerLotReference" in out.columns:
-        out["CustomerLotReference"] = out["CustomerLotReference"].apply(normalize_lot_number)
+    # Build only the projected columns; the (wide) source frame is never copied
     cols = CORE_COLS.copy()
-    if include_issue and "Issue" in out.columns:
+    if include_issue and "Issue" in df.columns:
         cols += ["Issue"]
-    if "DistinctPallets" in out.columns:
+    if "DistinctPallets" in df.columns:
         cols += ["DistinctPallets"]
-    cols = [c for c in cols if c in out.columns]
-    return out[cols]
+    updates = {c: "" for c in cols if c not in df.columns}
+    if "PalletId" in df.columns:
+        updates["PalletId"] = normalize_pallet_series(df["PalletId"])
+    if "CustomerLotReference" in df.columns:
+        updates["CustomerLotReference"] = normalize_lot_series(df["CustomerLotReference"])
+    return df[[c for c in cols if c in df.columns]].assign(**updates)[cols]
 
 def _lot_to_str(x): return normalize_lot_number(x)
+
+def _lot_options(s: pd.Series) -> List[str]:
+    """Sorted distinct non-empty LOTs: normalize each distinct value once, sort in numpy."""
+    lots = pd.unique(np.array([_lot_to_str(x) for x in pd.unique(s.dropna())], dtype=object))
+    return np.sort(lots[lots != ""].astype(str)).tolist()
+
+def _lot_eq_mask(s: pd.Series, lot: str) -> np.ndarray:
+    """Rows whose normalized LOT equals `lot`; on a categorical the compare runs once per category."""
+    return _category_mask(s, lambda v: normalize_lot_series(v).eq(lot))
+
 def maybe_limit(df: pd.DataFrame) -> pd.DataFrame:
     return df.head(1000) if st.session_state.get("fast_tables", False) else df
 
-# Precomputed indices for speed
-LOC_INDEX: Dict[str, pd.DataFrame] = {}
-for loc, g in filtered_inventory_df.groupby(filtered_inventory_df["LocationName"].astype(str)):
-    LOC_INDEX[str(loc)] = ensure_core(g)
-
 # ===== Pallet label builder (updated: put QTY first and sort by QTY ascending) =====
-def _mk_pallet_labels(df: pd.DataFrame):
+def _mk_pallet_labels_by_loc(df: pd.DataFrame) -> Tuple[Dict[str, Tuple[List[str], pd.DataFrame]], pd.Series]:
     """
-    Returns:
-      labels (List[str]): formatted labels sorted by Qty ASC (QTY 0..N first)
-      label_to_key (Dict[str, Any]): label -> internal row key
-      df_with_keys (pd.DataFrame)
+    Builds the pallet dropdown data for every location in one vectorized pass.
+    Returns ({location: (labels, df_with_keys)}, label_keys):
+      labels (List[str]): formatted labels sorted by Qty ASC (QTY 0..N first), then PalletId
+      df_with_keys (pd.DataFrame): the location's rows with a _PID_KEY column
+      label_keys (pd.Series): (location, label) -> internal row key, one Series for all locations
     Label format: "QTY {qty} — {PalletId} — SKU {sku} — LOT {lot}"
     """
-    df = df.copy()
-    df["PalletId"] = df["PalletId"].apply(normalize_pallet_id)
-    df["CustomerLotReference"] = df["CustomerLotReference"].apply(_lot_to_str)
-
-    def _label(r):
-        pid = r.get("PalletId", "") or "[blank]"
-        sku = r.get("WarehouseSku", "") or "[no SKU]"
-        lot = r.get("CustomerLotReference", "") or "[no LOT]"
-        qty = r.get("Qty", 0)
-        try:
-            qty_i = int(qty)
-        except Exception:
-            qty_i = qty
-        # Put QTY up-front for quick scanning; left-pad to align
-        return f"QTY {qty_i:>3} — {pid} — SKU {sku} — LOT {lot}", qty_i
-
-    df["_PID_KEY"] = df["PalletId"].where(df["PalletId"].astype(str).str.len() > 0, df.index.astype(str))
-    uniq = df.drop_duplicates(subset=["_PID_KEY"]).copy()
-    tmp = [(_label(r), r) for _, r in uniq.iterrows()]
-    # sort by Qty ascending
-    tmp_sorted = sorted(tmp, key=lambda t: (t[0][1] if isinstance(t[0][1], int) else 0, str(t[1].get("PalletId", ""))))
-    labels = [t[0][0] for t in tmp_sorted]
-    label_to_key = { (_label(r)[0]): r["_PID_KEY"] for _, r in uniq.iterrows() }
-    return labels, label_to_key, df
-
-PALLET_LABELS_BY_LOC: Dict[str, Tuple[List[str], dict, pd.DataFrame]] = {}
-for loc, df in LOC_INDEX.items():
-    PALLET_LABELS_BY_LOC[loc] = _mk_pallet_labels(df)
+    if df.empty:
+        return {}, pd.Series(dtype=object)
+    # Pallet IDs normalized column-wise; LOT is only needed on the de-duplicated label rows
+    pid = normalize_pallet_series(df["PalletId"])
+    # Location stays categorical when it is (the loaded inventory): the groupbys below then hash int codes
+    locs = df["LocationName"]
+    if not isinstance(locs.dtype, pd.CategoricalDtype):
+        locs = locs.astype(str)
+    df = df.assign(PalletId=pid, _PID_KEY=pid.where(pid.astype(str).str.len() > 0, df.index.astype(str)))
+    uniq = df.assign(_LOC=locs).drop_duplicates(subset=["_LOC", "_PID_KEY"])
+    uniq = uniq.assign(CustomerLotReference=normalize_lot_series(uniq["CustomerLotReference"].astype(object)))
+
+    def _text(col: str, blank: str) -> pd.Series:
+        if col not in uniq.columns:
+            return pd.Series(blank, index=uniq.index)
+        s = uniq[col].astype(object).fillna("").astype(str)
+        return s.where(s != "", blank)
+
+    # Label text built column-wise; QTY up-front (left-padded) for quick scanning
+    qty_raw = uniq["Qty"] if "Qty" in uniq.columns else pd.Series(0, index=uniq.index)
+    qty_num = pd.to_numeric(qty_raw, errors="coerce")
+    qty_ok = np.isfinite(qty_num.to_numpy(dtype=float))
+    qty_int = np.trunc(qty_num.where(qty_ok, 0).to_numpy(dtype=float)).astype(np.int64)
+    qty_txt = pd.Series(np.where(qty_ok, qty_int.astype(str), qty_raw.astype(str).to_numpy()), index=uniq.index)
+    label = ("QTY " + qty_txt.str.rjust(3) + " — " + _text("PalletId", "[blank]")
+             + " — SKU " + _text("WarehouseSku", "[no SKU]") + " — LOT " + _text("CustomerLotReference", "[no LOT]"))
+    labels_arr = label.to_numpy(dtype=object)
+    keys_arr = uniq["_PID_KEY"].to_numpy(dtype=object)
+    # sort keys: Qty ascending (non-numeric Qty sorts as 0), then PalletId
+    q = np.where(qty_ok, qty_int, 0)
+    p = uniq["PalletId"].astype(str).to_numpy(dtype=str)
+
+    # Label -> key lookup as one indexed Series (built in C); a repeated label keeps its last key
+    label_keys = pd.Series(keys_arr, index=pd.MultiIndex.from_arrays([uniq["_LOC"].to_numpy(), labels_arr]))
+    label_keys = label_keys[~label_keys.index.duplicated(keep="last")]
+
+    rows_by_loc = locs.groupby(locs, observed=True).indices
+    out: Dict[str, Tuple[List[str], pd.DataFrame]] = {}
+    for loc, pos in uniq.groupby("_LOC", observed=True).indices.items():
+        ordered = pos[np.lexsort((p[pos], q[pos]))]  # stable: ties keep row order
+        out[loc] = (labels_arr[ordered].tolist(), df.iloc[rows_by_loc[loc]])
+    return out, label_keys
+
+def _inventory_views(data_sig: str):
+    """
+    (core view, per-location index, upper-cased Pallet IDs, pallet labels, label keys) for the filtered inventory,
+    rebuilt only when the inventory file's signature changes. A session memo rather than st.cache_data:
+    ~2k per-location frames are cheap to keep but slow to pickle.
+    """
+    def build():
+        core = ensure_core(filtered_inventory_df)
+        # Group on the categorical itself: keys hash as int codes, not strings
+        loc_index = {str(loc): g for loc, g in core.groupby("LocationName", observed=True)}
+        # PalletId is near-unique (not categorical): upper-case it once for every Pallet ID search
+        pid_upper = core["PalletId"].astype(str).str.upper()
+        return (core, loc_index, pid_upper) + _mk_pallet_labels_by_loc(core)
+    return _session_memo("inventory_views", data_sig, build)
+
+# Precomputed indices for speed
+# Core (normalized, projected) view of the filtered inventory, shared by NLQ, Search Center,
+# the flat bulk list and the location detail instead of re-running ensure_core per use
+CORE_INVENTORY_DF, LOC_INDEX, CORE_PALLET_ID_UPPER, PALLET_LABELS_BY_LOC, PALLET_KEY_BY_LABEL = _inventory_views(_file_sig(inventory_file))
+
+def _core_pid_contains(needle: str) -> np.ndarray:
+    """_contains_ci on CORE_INVENTORY_DF["PalletId"], reusing the pre-upper-cased column."""
+    return CORE_PALLET_ID_UPPER.str.contains(str(needle).upper(), regex=False, na=False).to_numpy(dtype=bool)
 
 # ===== File freshness badge =====
 def _file_freshness_panel():
@@ -533,7 +861,7 @@ def _file_freshness_panel():
         age_txt = f"{int(age.total_seconds()//60)} min" if age < timedelta(hours=2) else f"{age.days} d {int((age.seconds)//3600)} h"
     except Exception:
         mtime = None; age_txt = "n/a"
-    md5 = _file_md5(inventory_file)
+    md5 = _file_md5_memo(inventory_file)
     md5_short = md5[:8] if md5 else "n/a"
     since_snap = "n/a"
     if os.path.isfile(TRENDS_FILE):
@@ -550,6 +878,11 @@ def _file_freshness_panel():
 _file_freshness_panel()
 
 # ===== Logging (with Reason codes) =====
+FIX_REASONS = ("Relocated", "Consolidated", "Data correction", "Damaged pull-down", "Other")
+# Column sets shared by every rerun of the Discrepancies page
+DISCREPANCY_KEY_COLS = ("LocationName", "PalletId", "WarehouseSku", "CustomerLotReference", "Issue")
+BULK_GRID_COLS = ("LocationName", "WarehouseSku", "CustomerLotReference", "PalletId", "Qty", "Issue")
+
 def _resolved_has_reason() -> bool:
     try:
         if os.path.isfile(resolved_file):
@@ -578,8 +911,8 @@ def _row_key(row: dict, discrepancy_type: str) -> str:
     ]
     return "\n".join(fields)
 
-def log_action(row: dict, note: str, selected_lot: str, discrepancy_type: str, action: str, batch_id: str, reason: str = "") -> Tuple[bool, str, str]:
-    has_reason = _resolved_has_reason()
+def _action_csv_row(row: dict, note: str, selected_lot: str, discrepancy_type: str, action: str, batch_id: str,
+                    reason: str, has_reason: bool) -> List:
     csv_row_v1 = [
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         action, batch_id, discrepancy_type, _row_key(row, discrepancy_type),
@@ -588,24 +921,31 @@ def log_action(row: dict, note: str, selected_lot: str, discrepancy_type: str, a
         (f"[Reason: {reason}] " if reason and not has_reason else "") + (note or ""),
         selected_lot
     ]
-    if has_reason:
-        csv_row = csv_row_v1 + [reason]
-        header = RESOLVED_HEADER_V2
-    else:
-        csv_row = csv_row_v1
-        header = RESOLVED_HEADER_V1
-    ok, used_path, err = _safe_append_csv(resolved_file, header, csv_row)
-    return ok, used_path, err
+    return csv_row_v1 + [reason] if has_reason else csv_row_v1
+
+def log_actions(rows: List[dict], note: str, discrepancy_type: str, action: str, batch_id: str,
+                reason: str = "", selected_lot=None) -> Tuple[bool, str, str]:
+    """
+    Append one log row per record in a single write (the header check and file open happen once per batch).
+    selected_lot: one LOT for every row, or None to take each record's own "SelectedLOT" (UNDO of a batch).
+    """
+    if not rows:
+        return True, resolved_file, ""
+    has_reason = _resolved_has_reason()
+    csv_rows = [_action_csv_row(r, note, r.get("SelectedLOT", "") if selected_lot is None else selected_lot,
+                                discrepancy_type, action, batch_id, reason, has_reason) for r in rows]
+    header = RESOLVED_HEADER_V2 if has_reason else RESOLVED_HEADER_V1
+    return _safe_append_csv_rows(resolved_file, header, csv_rows)
+
+def log_action(row: dict, note: str, selected_lot: str, discrepancy_type: str, action: str, batch_id: str, reason: str = "") -> Tuple[bool, str, str]:
+    return log_actions([row], note, discrepancy_type, action, batch_id, reason=reason, selected_lot=selected_lot)
 
 def log_batch(df_rows: pd.DataFrame, note: str, selected_lot: str, discrepancy_type: str, action: str, reason: str = "") -> Tuple[str, str]:
     batch_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-    used_path = resolved_file
-    for _, r in df_rows.iterrows():
-        ok, upath, err = log_action(r.to_dict(), note, selected_lot, discrepancy_type, action, batch_id, reason=reason)
-        used_path = upath
-        if not ok:
-            st.error(f"Failed to write action log.\n{err}")
-            break
+    ok, used_path, err = log_actions(df_rows.to_dict("records"), note, discrepancy_type, action, batch_id,
+                                     reason=reason, selected_lot=selected_lot)
+    if not ok:
+        st.error(f"Failed to write action log.\n{err}")
     return batch_id, used_path
 
 def read_action_log() -> pd.DataFrame:
@@ -635,85 +975,105 @@ def download_fix_log_button(where_key: str = "fixlog"):
         )
 
 # ===== Discrepancies (calculations) =====
-def analyze_bulk_locations_grouped(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = exclude_damage_missing(df)
-    results = []
-    letter_mask = df2["LocationName"].str[0].str.upper().isin(bulk_rules.keys())
-    df2 = df2[letter_mask]
-    df2 = df2[~df2["LocationName"].astype(str).str.upper().str.startswith("IB")]
-    if df2.empty:
+def analyze_bulk_locations_grouped(df: pd.DataFrame, bulk_locations: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows in bulk slots holding more pallets than their zone allows (IB* slots excluded).
+    Per-slot counts come from build_bulk_views' table, so the inventory is not grouped a second time.
+    """
+    if bulk_locations is None or bulk_locations.empty:
         return pd.DataFrame()
-    slot_counts = df2.groupby("LocationName").size()
-    for slot, count in slot_counts.items():
-        zone = str(slot)[0].upper()
-        max_pallets = bulk_rules.get(zone)
-        if max_pallets is not None and count > max_pallets:
-            slot_df = df2[df2["LocationName"] == slot]
-            for _, row in slot_df.iterrows():
-                rec = row.to_dict()
-                rec["Issue"] = f"Exceeds max allowed: {count} > {max_pallets}"
-                results.append(rec)
-    return pd.DataFrame(results)
-
-bulk_df = analyze_bulk_locations_grouped(filtered_inventory_df)
-
-def analyze_discrepancies(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = exclude_damage_missing(df)
+    slot_names = bulk_locations["LocationName"].astype(str)
+    over = bulk_locations[(bulk_locations["PalletCount"] > bulk_locations["MaxAllowed"])
+                          & ~slot_names.str.upper().str.startswith("IB")]
+    if over.empty:
+        return pd.DataFrame()
+    issue = "Exceeds max allowed: " + over["PalletCount"].astype(str) + " > " + over["MaxAllowed"].astype(str)
+    issue_by_slot = dict(zip(over["LocationName"].astype(str).to_numpy(), issue.to_numpy()))
+    hit = _category_mask(df["LocationName"], lambda v: v.isin(issue_by_slot.keys()))
+    rows = df[hit]
+    rows = rows.assign(Issue=rows["LocationName"].astype(str).map(issue_by_slot))
+    # slot order, then original row order within a slot
+    rows = rows.sort_values("LocationName", kind="mergesort", key=lambda s: s.astype(str))
+    return rows.reset_index(drop=True)
+
+def analyze_discrepancies(df: pd.DataFrame, flags: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
     results = []
+    # Each rule is one column-wide mask over the location flags and Qty, sliced once
+    f = _loc_flags(df["LocationName"]) if flags is None else flags
+    qty = df["Qty"].to_numpy()
     # Partial bin issues
-    p_df = get_partial_bins(df2)
-    if not p_df.empty:
-        pe = p_df[(p_df["Qty"] > 5) | (p_df["PalletCount"] > 1)]
-        for _, row in pe.iterrows():
-            issue = "Qty too high for partial bin" if row["Qty"] > 5 else "Multiple pallets in partial bin"
-            rec = row.to_dict(); rec["Issue"] = issue
-            results.append(rec)
+    pe = _take(df, _partial_mask(f) & ((qty > 5) | (df["PalletCount"].to_numpy() > 1)))
+    results.append(pe.assign(Issue=np.where(pe["Qty"] > 5, "Qty too high for partial bin", "Multiple pallets in partial bin")))
     # Full rack issues
-    s = df2["LocationName"].astype(str)
     # Full bins are numeric and (not ...01 OR startswith 111); here we find items that are NOT full (Qty outside 6..15)
-    full_mask = ((~s.str.endswith("01")) | (s.str.startswith("111"))) & s.str.isnumeric()
-    f_df = df2.loc[full_mask]
-    if not f_df.empty:
-        fe = f_df[~f_df["Qty"].between(6, 15)]
-        for _, row in fe.iterrows():
-            rec = row.to_dict()
-            rec["Issue"] = "Partial Pallet needs to be moved to Partial Location"
-            results.append(rec)
+    full_mask = (~f["ends01"] | f["starts111"]) & f["numeric"] & ~((qty >= 6) & (qty <= 15))
+    results.append(_take(df, full_mask).assign(Issue="Partial Pallet needs to be moved to Partial Location"))
     # Multi-pallet in racks
-    _, mp_details = _find_multi_pallet_all_racks(df2)
-    if mp_details is not None and not mp_details.empty:
-        results += mp_details.to_dict("records")
-    out = pd.DataFrame(results)
+    _, mp_details = _find_multi_pallet_all_racks(df)
+    if mp_details is not None:
+        results.append(mp_details)
+    results = [r for r in results if not r.empty]
+    if not results:
+        return pd.DataFrame()
+    # Labelled frames stacked as-is; categoricals go back to plain strings
+    out = pd.concat(results, ignore_index=True)
+    for c in out.columns:
+        if isinstance(out[c].dtype, pd.CategoricalDtype):
+            out[c] = out[c].astype(str)
     if not out.empty:
-        keep_cols = [c for c in ["LocationName", "PalletId", "WarehouseSku", "CustomerLotReference", "Issue"] if c in out.columns]
+        keep_cols = [c for c in DISCREPANCY_KEY_COLS if c in out.columns]
         out = out.drop_duplicates(subset=keep_cols)
     return out
 
-discrepancy_df = analyze_discrepancies(filtered_inventory_df)
-
 # ===== Duplicate Pallets (case-insensitive) =====
 def build_duplicate_pallets(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    base = df.copy()
-    base["PalletId"] = base["PalletId"].apply(normalize_pallet_id)
-    base["PalletId_norm"] = base["PalletId"].astype(str).str.strip().str.upper()
-    grp = base.groupby("PalletId_norm")["LocationName"].nunique().reset_index(name="DistinctLocations")
-    # Build locations list per PalletId_norm for summary
-    locs_by_pid = (
-        base.groupby("PalletId_norm")["LocationName"]
-        .apply(lambda s: ", ".join(sorted({str(x) for x in s if str(x).strip()})))
-        .reset_index(name="Locations")
-    )
+    pid = normalize_pallet_series(df["PalletId"])
+    base = df.assign(PalletId=pid, PalletId_norm=pid.str.upper())  # normalize_pallet_series already strips
+    grp = _distinct_count(base, "PalletId_norm", "LocationName", "DistinctLocations")
     dups = grp[(grp["PalletId_norm"].astype(str).str.len() > 0) & (grp["DistinctLocations"] > 1)].sort_values("DistinctLocations", ascending=False)
-    # Attach Locations list to the duplicate summary
-    dups = dups.merge(locs_by_pid, on="PalletId_norm", how="left")
+    # Locations list, only for the duplicated ids: distinct non-blank (id, location) pairs, sorted, joined per id
+    in_dups = base["PalletId_norm"].isin(dups["PalletId_norm"]).to_numpy()
+    pairs = base.loc[in_dups, ["PalletId_norm", "LocationName"]]
+    pairs = pairs.assign(LocationName=pairs["LocationName"].astype(str))
+    pairs = pairs[pairs["LocationName"].str.strip().str.len() > 0].drop_duplicates().sort_values(["PalletId_norm", "LocationName"])
+    locs_by_pid = pairs.groupby("PalletId_norm", sort=False)["LocationName"].agg(", ".join)
+    dups = dups.assign(Locations=dups["PalletId_norm"].map(locs_by_pid).fillna("").astype(str)).reset_index(drop=True)
     if dups.empty:
         return dups.rename(columns={"PalletId_norm": "PalletId"}), pd.DataFrame()
-    dup_ids = set(dups["PalletId_norm"])
-    details = base[base["PalletId_norm"].isin(dup_ids)].copy()
+    details = base[in_dups]
     dups = dups.rename(columns={"PalletId_norm": "PalletId"})
     return dups, ensure_core(details)
 
-dups_summary_df, dups_detail_df = build_duplicate_pallets(filtered_inventory_df)
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def _cached_discrepancy_tables(data_key: str, _df: pd.DataFrame, _flags: Dict[str, np.ndarray],
+                               _bulk_locations: pd.DataFrame):
+    """Bulk/rack discrepancies and duplicate pallets, recomputed only when data_key changes (not on every widget rerun)."""
+    bulk = analyze_bulk_locations_grouped(_df, _bulk_locations)
+    rack = analyze_discrepancies(_df, _flags)
+    dups_summary, dups_detail = build_duplicate_pallets(_df)
+    return bulk, rack, dups_summary, dups_detail
+
+bulk_df, discrepancy_df, dups_summary_df, dups_detail_df = _cached_discrepancy_tables(
+    _data_key(), filtered_inventory_df, FILTERED_LOC_FLAGS, bulk_locations_df)
+# Row positions per normalized PalletId: detail lookups become a dict hit + iloc instead of a full string compare
+# (the detail PalletIds come out of normalize_pallet_series, so they are already stripped strings)
+DUP_DETAIL_POS: Dict[str, np.ndarray] = (
+    dups_detail_df.groupby(dups_detail_df["PalletId"].str.upper(), sort=False).indices
+    if not dups_detail_df.empty else {}
+)
+
+def dup_detail_rows(pid_norm: str) -> pd.DataFrame:
+    return dups_detail_df.iloc[DUP_DETAIL_POS.get(pid_norm, np.array([], dtype=np.intp))]
+
+@st.cache_data(ttl=600, max_entries=16, show_spinner=False)
+def _cached_lot_options(data_key: str, table: str, _lots: pd.Series) -> List[str]:
+    """LOT dropdown options for one discrepancy table ("rack"/"bulk"), built once per data_key."""
+    return _lot_options(_lots)
+
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def _cached_dup_options(data_key: str, _pids: pd.Series) -> List[str]:
+    """Duplicate Pallet ID dropdown options (summary order), built once per data_key."""
+    return ["(Select)"] + _pids.astype(str).tolist()
 
 # ===== Natural Language Query (Ask Bin Helper) =====
 from dataclasses import dataclass
@@ -723,27 +1083,39 @@ class NLQResult:
     explanation: str
     warning: str = ""
 
+# Query patterns, compiled once at import rather than looked up on every question
+_NUM_RE = re.compile(r"\d+")
+_BETWEEN_RE = re.compile(r"between\s+(\d+)\s+and\s+(\d+)")
+_LE_RE = re.compile(r"(or\s+less|at\s+most|<=|≤)")
+_GE_RE = re.compile(r"(or\s+more|at\s+least|>=|≥)")
+_EQ_RE = re.compile(r"(\bexactly\b|\bequal(?:s)?\s+to\b|==)")
+_AISLE_RE = re.compile(r"aisle\s+(\d{3})")
+_PALLET_Q_RE = re.compile(r"(?:pallet|pallet id)\s+([A-Za-z0-9\-]+)", re.IGNORECASE)
+_LOT_Q_RE = re.compile(r"(?:lot|lot number)\s+(\d+)", re.IGNORECASE)
+_SKU_Q_RE = re.compile(r"(?:sku)\s+([A-Za-z0-9\-]+)", re.IGNORECASE)
+_LOC_Q_RE = re.compile(r"(?:location|bin)\s+(?:contains|like)\s+([A-Za-z0-9\-]+)", re.IGNORECASE)
+
 def _num_from_text(s: str) -> List[int]:
-    return [int(x) for x in re.findall(r"\d+", s or "")]
+    return [int(x) for x in _NUM_RE.findall(s or "")]
 
 def parse_comparator(q: str):
     ql = (q or "").lower()
     # between X and Y
-    m_between = re.search(r"between\s+(\d+)\s+and\s+(\d+)", ql)
+    m_between = _BETWEEN_RE.search(ql)
     if m_between:
         a, b = int(m_between.group(1)), int(m_between.group(2))
         lo, hi = min(a, b), max(a, b)
         return ("between", lo, hi)
     # ≤ like "or less", "at most", "<=", "≤"
-    if re.search(r"(or\s+less|at\s+most|<=|≤)", ql):
+    if _LE_RE.search(ql):
         nums = _num_from_text(ql)
         return ("le", max(nums or [0]))
     # ≥ like "or more", "at least", ">=", "≥"
-    if re.search(r"(or\s+more|at\s+least|>=|≥)", ql):
+    if _GE_RE.search(ql):
         nums = _num_from_text(ql)
         return ("ge", max(nums or [0]))
     # = exactly (exactly N, equals N, == N)
-    if re.search(r"(\bexactly\b|\bequal(?:s)?\s+to\b|==)", ql):
+    if _EQ_RE.search(ql):
         nums = _num_from_text(ql)
         return ("eq", nums[0] if nums else 0)
     # plain "with N" -> equality default
@@ -758,7 +1130,7 @@ def parse_nl_query(q: str) -> NLQResult:
         return NLQResult(pd.DataFrame(), "Type something like: 'show me bulk locations with 5 pallets or less'.")
     # --- BULK domain ---
     if "bulk" in ql:
-        df = bulk_locations_df.copy()
+        df = bulk_locations_df
         # empty slot(s) intent
         if "empty slot" in ql or "empty slots" in ql or "available" in ql:
             cmp = parse_comparator(ql)
@@ -803,19 +1175,19 @@ def parse_nl_query(q: str) -> NLQResult:
             return NLQResult(df, "All bulk locations.")
     # --- DUPLICATES ---
     if "duplicate" in ql or "duplicates" in ql:
-        m_pid = re.search(r"(?:pallet|pallet id)\s+([A-Za-z0-9\-]+)", q or "", re.IGNORECASE)
+        m_pid = _PALLET_Q_RE.search(q or "")
         if m_pid:
             pid_norm = m_pid.group(1).strip().upper()
-            det = dups_detail_df[dups_detail_df["PalletId"].astype(str).str.strip().str.upper() == pid_norm]
+            det = dup_detail_rows(pid_norm)
             return NLQResult(ensure_core(det), f"Duplicate detail for PalletId {pid_norm}.")
-        return NLQResult(dups_summary_df.copy(), "Duplicate pallet summary (PalletId with distinct location count).")
+        return NLQResult(dups_summary_df, "Duplicate pallet summary (PalletId with distinct location count).")
     # --- PARTIAL / FULL / RACK MULTI-PALLET ---
     if "partial bin" in ql or "partial bins" in ql or "partial" in ql:
         df = ensure_core(partial_bins_df)
-        m = re.search(r"aisle\s+(\d{3})", ql)
+        m = _AISLE_RE.search(ql)
         if m:
             prefix = m.group(1)
-            df = df[df["LocationName"].astype(str).str.startswith(prefix)]
+            df = _take(df, _category_mask(df["LocationName"], lambda v: v.str.startswith(prefix)))
             return NLQResult(df, f"Partial bins in aisle {prefix}.")
         return NLQResult(df, "All partial bins.")
     if "full" in ql and "bin" in ql:
@@ -831,45 +1203,51 @@ def parse_nl_query(q: str) -> NLQResult:
     if "missing" in ql:
         return NLQResult(ensure_core(missing_df), "Missing pallets.")
     # --- Pallet / LOT / SKU / Location queries ---
-    m_pid = re.search(r"(?:pallet|pallet id)\s+([A-Za-z0-9\-]+)", q or "", re.IGNORECASE)
+    m_pid = _PALLET_Q_RE.search(q or "")
     if m_pid:
         pid = normalize_pallet_id(m_pid.group(1))
-        base = ensure_core(filtered_inventory_df)
-        df = base[base["PalletId"].astype(str).str.strip().str.upper() == pid.strip().upper()]
+        base = CORE_INVENTORY_DF
+        # core Pallet IDs are already trimmed by ensure_core
+        df = _take(base, CORE_PALLET_ID_UPPER.eq(pid.strip().upper()).to_numpy())
         return NLQResult(df, f'Where is pallet "{pid}"?')
-    m_lot = re.search(r"(?:lot|lot number)\s+(\d+)", q or "", re.IGNORECASE)
+    m_lot = _LOT_Q_RE.search(q or "")
     if m_lot:
         lot = normalize_lot_number(m_lot.group(1))
-        base = ensure_core(filtered_inventory_df)
-        df = base[base["CustomerLotReference"].astype(str).str.contains(lot, case=False, na=False)]
+        base = CORE_INVENTORY_DF
+        df = _take(base, _contains_ci(base["CustomerLotReference"], lot))
         return NLQResult(df, f'Rows for LOT Number "{lot}".')
-    m_sku = re.search(r"(?:sku)\s+([A-Za-z0-9\-]+)", q or "", re.IGNORECASE)
+    m_sku = _SKU_Q_RE.search(q or "")
     if m_sku:
         sku = m_sku.group(1)
-        base = ensure_core(filtered_inventory_df)
-        df = base[base["WarehouseSku"].astype(str).str.contains(sku, case=False, na=False)]
+        base = CORE_INVENTORY_DF
+        df = _take(base, _contains_ci(base["WarehouseSku"], sku))
         return NLQResult(df, f'Rows for SKU containing "{sku}".')
-    m_loc = re.search(r"(?:location|bin)\s+(?:contains|like)\s+([A-Za-z0-9\-]+)", q or "", re.IGNORECASE)
+    m_loc = _LOC_Q_RE.search(q or "")
     if m_loc:
         frag = m_loc.group(1)
-        base = ensure_core(filtered_inventory_df)
-        df = base[base["LocationName"].astype(str).str.contains(frag, case=False, na=False)]
+        base = CORE_INVENTORY_DF
+        df = _take(base, _contains_ci(base["LocationName"], frag))
         return NLQResult(df, f'Rows where Location contains "{frag}".')
     # Fallback: direct location or global contains search
-    base = ensure_core(filtered_inventory_df)
+    base = CORE_INVENTORY_DF
     guess = (q or "").strip()
     if guess in LOC_INDEX:
         return NLQResult(LOC_INDEX[guess], f"Rows for location {guess}.")
-    frag = re.escape(guess)
     mask = (
-        base["LocationName"].astype(str).str.contains(frag, case=False, na=False)
-        | base["PalletId"].astype(str).str.contains(frag, case=False, na=False)
-        | base["WarehouseSku"].astype(str).str.contains(frag, case=False, na=False)
-        | base["CustomerLotReference"].astype(str).str.contains(normalize_lot_number(guess), case=False, na=False)
+        _contains_ci(base["LocationName"], guess)
+        | _core_pid_contains(guess)
+        | _contains_ci(base["WarehouseSku"], guess)
+        | _contains_ci(base["CustomerLotReference"], normalize_lot_number(guess))
     )
     df = base[mask]
     return NLQResult(df, f'Fallback search across Location, PalletId, SKU, LOT for "{guess}".')
 
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def _cached_nl_query(q: str, data_key: str) -> Tuple[pd.DataFrame, str, str]:
+    """Memoized parse_nl_query; data_key ties entries to the loaded inventory and bulk rules."""
+    res = parse_nl_query(q)
+    return res.df, res.explanation, res.warning
+
 def page_ask_bin_helper():
     st.subheader("🧠 Ask Bin Helper (Beta)")
     st.caption("Try: 'show me bulk locations with 5 pallets or less', 'bulk with at least 1 empty slot', 'find pallet JTL00496', 'partial bins in aisle 114', 'duplicates for pallet JTL00496'.")
@@ -880,7 +1258,7 @@ def page_ask_bin_helper():
     if ex4.button("Partial in aisle 114"): st.session_state["ask_nlq"] = "partial bins in aisle 114"
     q = st.text_input("Your request", value=st.session_state.get("ask_nlq", ""), placeholder='e.g., "show me bulk locations with 5 pallets or less"')
     if q.strip():
-        res = parse_nl_query(q)
+        res = NLQResult(*_cached_nl_query(q.strip(), _data_key()))
         st.markdown(f"**Understood:** {res.explanation}")
         if res.warning:
             st.warning(res.warning)
@@ -891,7 +1269,7 @@ def page_ask_bin_helper():
             maybe_inv = {"locationname","warehousesku","palletid","customerlotreference"}.issubset(cols)
             show_df = ensure_core(res.df) if maybe_inv else res.df
             render_lazy_df(show_df, key="ask_results", use_core=False)
-            st.download_button("Download results (CSV)", show_df.to_csv(index=False).encode("utf-8"),
+            st.download_button("Download results (CSV)", _csv_bytes(_data_key(), f"ask|{q.strip()}", show_df),
                                file_name="ask-bin-helper-results.csv", mime="text/csv")
 
 # ===== KPI Card CSS & extras =====
@@ -981,13 +1359,15 @@ _inject_card_css(card_style)
 
 # ===== Helper: Lazy-load table & skeleton =====
 def render_lazy_df(df: pd.DataFrame, key: str, page_size: int = 500, use_core: bool = False, include_issue: bool = False):
-    if use_core:
-        df = ensure_core(df, include_issue=include_issue)
     total = len(df)
     page = int(st.session_state.get(f"{key}_page", 1))
     end = min(page * page_size, total)
     st.caption(f"Showing **{end}** of **{total}** rows")
-    st.dataframe(df.head(end), use_container_width=True)
+    view = df.head(end)
+    if use_core:
+        # ensure_core is row-wise: normalize only the rows on screen, not the whole table
+        view = ensure_core(view, include_issue=include_issue)
+    st.dataframe(view, use_container_width=True)
     c1, c2, _ = st.columns([1,1,8])
     if end < total and c1.button("Load more", key=f"{key}_more"):
         st.session_state[f"{key}_page"] = page + 1
@@ -996,41 +1376,124 @@ def render_lazy_df(df: pd.DataFrame, key: str, page_size: int = 500, use_core: b
         st.session_state[f"{key}_page"] = 1
         _rerun()
 
+# download_button needs its bytes on every rerun: encode each export once per data_key + view
+@st.cache_data(ttl=600, max_entries=16, show_spinner=False)
+def _csv_bytes(data_key: str, view: str, _df: pd.DataFrame) -> bytes:
+    return _df.to_csv(index=False).encode("utf-8")
+
 def show_skeleton(n_rows: int = 8):
     with st.container():
         for _ in range(n_rows):
             st.markdown('<div class="skel-row"></div>', unsafe_allow_html=True)
 
-# ===== Robust single KPI helper (duplicate removed) =====
-def _animate_metric(ph, label: str, value, delta_text=None, duration_ms: int = 600, steps: int = 20):
-    """Animates KPI numbers for a quick count-up effect."""
+# ===== Helper: AgGrid options =====
+def _grid_schema(df: pd.DataFrame) -> Tuple[Tuple[str, str], ...]:
+    # GridOptionsBuilder.from_dataframe only looks at column names and dtype kinds
+    return tuple((str(c), t.kind) for c, t in df.dtypes.items())
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _grid_options(grid: str, schema: Tuple[Tuple[str, str], ...], expand_all: bool, _sample: pd.DataFrame) -> dict:
+    """
+    gridOptions for the bulk grids ("bulk_disc": grouped discrepancy rows, "bulk_locations": slot picker).
+    Built once per column schema instead of on every rerun; `_sample` only supplies the columns.
+    """
+    gb = GridOptionsBuilder.from_dataframe(_sample.head(0))
+    gb.configure_default_column(resizable=True, filter=True, sortable=True, floatingFilter=True)
+    cols = {c for c, _ in schema}
+    if grid == "bulk_locations":
+        if JsCode is not None:
+            get_row_class = JsCode("""
+function(params) {
+  if (params.data && (params.data.PalletCount > params.data.MaxAllowed)) {
+    return 'overCapRow';
+  }
+  return null;
+}
+""")
+            gb.configure_grid_options(getRowClass=get_row_class)
+        gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=50)
+        gb.configure_side_bar()
+        gb.configure_selection("single", use_checkbox=True)
+        return gb.build()
+    gb.configure_column("LocationName", rowGroup=True, hide=True)
+    if "WarehouseSku" in cols: gb.configure_column("WarehouseSku", pinned="left")
+    if "Qty" in cols: gb.configure_column("Qty", pinned="right")
+    if "Issue" in cols: gb.configure_column("Issue", cellStyle={"color": RED, "fontWeight": "bold"})
+    gb.configure_selection("multiple", use_checkbox=True, groupSelectsChildren=True, groupSelectsFiltered=True)
+    gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=100)
+    gb.configure_side_bar()
+    if "Qty" in cols: gb.configure_column("Qty", aggFunc="sum")
+    if JsCode is not None:
+        get_row_style = JsCode("""
+function(params) {
+  if (params.data && params.data.Issue && params.data.Issue.length > 0) {
+    return { 'background-color': '#fff0f0' };
+  }
+  return null;
+}
+""")
+        gb.configure_grid_options(getRowStyle=get_row_style)
+    gb.configure_grid_options(groupDefaultExpanded=(-1 if expand_all else 0),
+                              animateRows=True, enableRangeSelection=True,
+                              suppressAggFuncInHeader=False, domLayout="normal")
+    return gb.build()
+
+# ===== Helper: dashboard chart specs =====
+@st.cache_data(show_spinner=False, max_entries=32)
+def _pie_spec(names: str, labels: Tuple[str, ...], counts: Tuple[int, ...],
+              colors: Tuple[Tuple[str, str], ...], hole: float, height: int) -> dict:
+    """Plotly pie figure dict for a handful of (label, count) slices; rebuilt only when the counts change."""
+    df = pd.DataFrame({names: list(labels), "Count": list(counts)})
+    fig = px.pie(df, values="Count", names=names, color=names, color_discrete_map=dict(colors), hole=hole)
+    fig.update_layout(showlegend=True, height=height)
+    return fig.to_dict()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _zone_bar_spec(rows: Tuple[Tuple[str, int, int, int], ...]) -> dict:
+    """Grouped Occupied/Empty/Capacity bar per bulk zone from (Zone, Occupied, Empty, Capacity) rows."""
+    by_zone = pd.DataFrame(list(rows), columns=["Zone", "Occupied", "Empty", "Capacity"])
+    df_zone_melt = by_zone.melt(id_vars="Zone", value_vars=["Occupied","Empty","Capacity"],
+                                var_name="Metric", value_name="Count")
+    fig_zone = px.bar(
+        df_zone_melt, x="Zone", y="Count", color="Metric", barmode="group",
+        color_discrete_map={"Occupied": BLUE, "Empty": RED, "Capacity": "#888888"}
+    )
+    fig_zone.update_layout(height=360, xaxis_title="Bulk Zone", yaxis_title="Count")
+    return fig_zone.to_dict()
+
+# ===== Robust KPI helpers =====
+def _show_metric(ph, label: str, value, delta=None):
     try:
-        v_end = int(value) if value is not None else 0
-        d_text = None if delta_text in (None, "") else str(delta_text)
-        if not st.session_state.get("animate_kpis", True) or v_end <= 0:
-            try:
-                ph.metric(label, v_end, delta=d_text)
-            except Exception:
-                st.metric(label, v_end, delta=d_text)
-            return
+        ph.metric(label, value, delta=delta)
+    except Exception:
+        st.metric(label, value, delta=delta)
+
+def _animate_metrics(cards, duration_ms: int = 600, steps: int = 20):
+    """
+    Count-up effect for a row of KPI placeholders. cards: [(placeholder, label, value, delta_text), ...]
+    All cards step together in one loop, so the row takes duration_ms in total rather than per card.
+    """
+    try:
+        cards = [(ph, label, int(value) if value is not None else 0, None if delta_text in (None, "") else str(delta_text))
+                 for ph, label, value, delta_text in cards]
+    except Exception:
+        for ph, label, value, delta_text in cards:
+            _show_metric(ph, label, value if value is not None else 0, delta_text if delta_text else None)
+        return
+    animate = st.session_state.get("animate_kpis", True)
+    for ph, label, v_end, d_text in cards:
+        if not animate or v_end <= 0:
+            _show_metric(ph, label, v_end, d_text)
+    moving = [c for c in cards if animate and c[2] > 0]
+    if moving:
         steps = max(8, min(40, int(steps)))
         sleep_s = max(0.01, float(duration_ms) / 1000.0 / steps)
         for i in range(1, steps + 1):
-            v = int(round(v_end * i / steps))
-            try:
-                ph.metric(label, v)
-            except Exception:
-                st.metric(label, v)
+            for ph, label, v_end, _ in moving:
+                _show_metric(ph, label, int(round(v_end * i / steps)))
             time.sleep(sleep_s)
-        try:
-            ph.metric(label, v_end, delta=d_text)
-        except Exception:
-            st.metric(label, v_end, delta=d_text)
-    except Exception:
-        try:
-            ph.metric(label, value if value is not None else 0, delta=delta_text if delta_text else None)
-        except Exception:
-            st.metric(label, value if value is not None else 0, delta=delta_text if delta_text else None)
+        for ph, label, v_end, d_text in moving:
+            _show_metric(ph, label, v_end, d_text)
 
 # ===== NAV =====
 nav_options = [
@@ -1043,45 +1506,42 @@ nav_options = [
     # Standalone "Duplicate Pallets" removed — duplicates live inside Discrepancies
     "Bulk Locations", "Empty Bulk Locations", "Trends", "Config", "Self-Test"
 ]
-_default_nav = st.session_state.get("nav", "Dashboard")
-if "pending_nav" in st.session_state:
-    _default_nav = st.session_state.pop("pending_nav", _default_nav)
-try:
-    _default_index = nav_options.index(_default_nav) if _default_nav in nav_options else 0
-except ValueError:
-    _default_index = 0
-
 # Quick Jump (scan/enter): pallet id or location
+def _jump_nav(loc: str) -> str:
+    return "Bulk Locations" if loc and loc[0].upper() in bulk_rules else "Discrepancies (All)"
+
 def _handle_quick_jump():
     q = st.session_state.get("quick_jump_text", "").strip()
     if not q:
         st.session_state.jump_intent = {}
         return
-    # Pallet ID (case-insensitive)
+    # Pallet ID (case-insensitive), against the pre-upper-cased ids (row-aligned with filtered_inventory_df)
     q_pid = q.upper()
     try:
-        pid_series = filtered_inventory_df["PalletId"].astype(str).str.strip().str.upper()
+        hit = CORE_PALLET_ID_UPPER.eq(q_pid).to_numpy(dtype=bool)
     except Exception:
-        pid_series = pd.Series([], dtype=str)
-    match_rows = filtered_inventory_df[pid_series == q_pid]
-    if not match_rows.empty:
-        loc = str(match_rows.iloc[0]["LocationName"])
+        # (an empty Series here could not be aligned as a row mask) -> no pallet match
+        hit = np.zeros(len(filtered_inventory_df), dtype=bool)
+    match_pos = np.flatnonzero(hit)
+    if match_pos.size:
+        loc = str(filtered_inventory_df["LocationName"].iloc[match_pos[0]])
         st.session_state.jump_intent = {"type": "pallet", "location": loc, "pallet_id": q}
-        st.session_state["pending_nav"] = "Bulk Locations" if loc and loc[0].upper() in bulk_rules else "Discrepancies (All)"
-        _rerun(); return
+        st.session_state["nav"] = _jump_nav(loc)
+        return
     # Try Location
     if q in LOC_INDEX:
         st.session_state.jump_intent = {"type": "location", "location": q}
-        st.session_state["pending_nav"] = "Bulk Locations" if q and q[0].upper() in bulk_rules else "Discrepancies (All)"
-        _rerun(); return
+        st.session_state["nav"] = _jump_nav(q)
+        return
     # Numeric location fallback
     if q.isnumeric() and q in LOC_INDEX:
         st.session_state.jump_intent = {"type": "location", "location": q}
-        st.session_state["pending_nav"] = "Bulk Locations" if q and q[0].upper() in bulk_rules else "Discrepancies (All)"
-        _rerun(); return
+        st.session_state["nav"] = _jump_nav(q)
+        return
     st.session_state.jump_intent = {"type": "none", "raw": q}
 
-selected_nav = st.radio("🔍 Navigate:", nav_options, index=_default_index, horizontal=True, key="nav")
+# No index=: starts on Dashboard; callbacks (Quick Jump, KPI cards) switch pages via st.session_state["nav"]
+selected_nav = st.radio("🔍 Navigate:", nav_options, horizontal=True, key="nav")
 st.text_input(
     "Quick Jump (scan or type Pallet ID or Location and press Enter)",
     value="",
@@ -1115,7 +1575,7 @@ def record_trend_snapshot(reason: str = "manual"):
     try:
         now_kpis = _current_kpis()
         ts = _now_local()
-        md5 = _file_md5(inventory_file)
+        md5 = _file_md5_memo(inventory_file)
         row = [
             ts.strftime("%Y-%m-%d %H:%M:%S"),
             str(reason or "manual"),
@@ -1156,7 +1616,7 @@ def _trend_auto_hooks():
         st.session_state["pending_trend_record"] = False
         reason = st.session_state.pop("pending_trend_record_reason", None)
         if not reason:
-            cur_md5 = _file_md5(inventory_file)
+            cur_md5 = _file_md5_memo(inventory_file)
             last_md5 = st.session_state.get("last_trend_md5", None)
             reason = "upload" if (cur_md5 and cur_md5 != last_md5) else "manual"
         ok, upath, err = record_trend_snapshot(reason=reason)
@@ -1206,7 +1666,7 @@ def _read_trends() -> pd.DataFrame:
         return pd.DataFrame()
 
 def _current_kpis() -> dict:
-    dam_qty = int(pd.to_numeric(damages_df["Qty"], errors="coerce").fillna(0).sum()) if ("Qty" in damages_df.columns and not damages_df.empty) else 0
+    dam_qty = int(damages_df["Qty"].sum()) if ("Qty" in damages_df.columns and not damages_df.empty) else 0
     return {
         "EmptyBins": len(empty_bins_view_df),
         "EmptyPartialBins": len(empty_partial_bins_df),
@@ -1256,19 +1716,50 @@ def _delta_combo_text(vs_last, vs_yday):
         parts.append(f"{_delta_text(vs_yday)} vs 24h")
     return " \\\n".join(parts) if parts else None
 
+# ===== Search Center =====
+@_fragment
+def _render_search_center():
+    """Dashboard search box. A fragment: typing a filter reruns only this block, not the KPIs and charts above."""
+    st.markdown("### 🔎 Search Center")
+    sc1, sc2, sc3, sc4 = st.columns(4)
+    with sc1:
+        q_loc = st.text_input("Location contains", value=st.session_state.filters.get("LocationName", ""))
+    with sc2:
+        q_pid = st.text_input("Pallet ID contains", value=st.session_state.filters.get("PalletId", ""))
+    with sc3:
+        q_sku = st.text_input("SKU contains", value=st.session_state.filters.get("WarehouseSku", ""))
+    with sc4:
+        q_lot = st.text_input("LOT Number contains (numbers only)", value=st.session_state.filters.get("CustomerLotReference", ""))
+    if any([q_loc, q_pid, q_sku, q_lot]):
+        base = CORE_INVENTORY_DF
+        # AND every filter into one mask and slice once (no per-filter frame copies)
+        mask = np.ones(len(base), dtype=bool)
+        if q_loc:
+            mask &= _contains_ci(base["LocationName"], q_loc)
+        if q_pid:
+            mask &= _core_pid_contains(q_pid)
+        if q_sku:
+            mask &= _contains_ci(base["WarehouseSku"], q_sku)
+        if q_lot:
+            q_lot_norm = normalize_lot_number(q_lot)
+            mask &= _contains_ci(base["CustomerLotReference"], q_lot_norm)
+        df_show = base.iloc[np.flatnonzero(mask)]
+        st.caption("Results")
+        render_lazy_df(maybe_limit(df_show), key="search_center", use_core=False)
+
 # ===== Dashboard =====
 if selected_nav == "Dashboard":
     st.subheader("📊 Bin Helper Dashboard")
     # KPI Row
+    now = _current_kpis()
     kpi_vals = {
-        "Empty Bins": len(empty_bins_view_df),
-        "Empty Partial Bins": len(empty_partial_bins_df),
-        "Partial Bins": len(partial_bins_df),
-        "Full Pallet Bins": len(full_pallet_bins_df),
-        "Damages": int(pd.to_numeric(damages_df["Qty"], errors="coerce").fillna(0).sum()) if ("Qty" in damages_df.columns and not damages_df.empty) else 0, "Missing": len(missing_df),
+        "Empty Bins": now["EmptyBins"],
+        "Empty Partial Bins": now["EmptyPartialBins"],
+        "Partial Bins": now["PartialBins"],
+        "Full Pallet Bins": now["FullPalletBins"],
+        "Damages": now["Damages"], "Missing": now["Missing"],
     }
     hist = _read_trends()
-    now = _current_kpis()
     deltas = _kpi_deltas(hist, now)
     def _dx(key_name):
         m = {
@@ -1289,40 +1780,39 @@ if selected_nav == "Dashboard":
     LBL_MISSING = "🚫 Missing" + (" 🔴" if kpi_vals["Missing"] > 0 else "")
     col1, col2, col3, col4, col5, col6 = st.columns(6)
     k1 = col1.empty(); k2 = col2.empty(); k3 = col3.empty(); k4 = col4.empty(); k5 = col5.empty(); k6 = col6.empty()
-    _animate_metric(k1, LBL_EMPTY, kpi_vals["Empty Bins"], delta_text=_dx("Empty Bins"))
-    _animate_metric(k2, LBL_EMPTY_PART, kpi_vals["Empty Partial Bins"], delta_text=_dx("Empty Partial Bins"))
-    _animate_metric(k3, LBL_PARTIAL, kpi_vals["Partial Bins"], delta_text=_dx("Partial Bins"))
-    _animate_metric(k4, LBL_FULL, kpi_vals["Full Pallet Bins"], delta_text=_dx("Full Pallet Bins"))
-    _animate_metric(k5, LBL_DAMAGE, kpi_vals["Damages"], delta_text=_dx("Damages"))
-    _animate_metric(k6, LBL_MISSING, kpi_vals["Missing"], delta_text=_dx("Missing"))
-    if col1.button("View", key="btn_empty"): st.session_state["pending_nav"] = "Empty Bins"; _rerun()
-    if col2.button("View", key="btn_empty_partial"): st.session_state["pending_nav"] = "Empty Partial Bins"; _rerun()
-    if col3.button("View", key="btn_partial"): st.session_state["pending_nav"] = "Partial Bins"; _rerun()
-    if col4.button("View", key="btn_full"): st.session_state["pending_nav"] = "Full Pallet Bins"; _rerun()
-    if col5.button("View", key="btn_damage"): st.session_state["pending_nav"] = "Damages"; _rerun()
-    if col6.button("View", key="btn_missing"): st.session_state["pending_nav"] = "Missing"; _rerun()
+    _animate_metrics([
+        (k1, LBL_EMPTY, kpi_vals["Empty Bins"], _dx("Empty Bins")),
+        (k2, LBL_EMPTY_PART, kpi_vals["Empty Partial Bins"], _dx("Empty Partial Bins")),
+        (k3, LBL_PARTIAL, kpi_vals["Partial Bins"], _dx("Partial Bins")),
+        (k4, LBL_FULL, kpi_vals["Full Pallet Bins"], _dx("Full Pallet Bins")),
+        (k5, LBL_DAMAGE, kpi_vals["Damages"], _dx("Damages")),
+        (k6, LBL_MISSING, kpi_vals["Missing"], _dx("Missing")),
+    ])
+    # One widget for the six cards; its callback switches the nav radio before the rerun
+    def _open_kpi_page():
+        choice = st.session_state.get("kpi_open")
+        st.session_state["kpi_open"] = None
+        if choice in nav_options:
+            st.session_state["nav"] = choice
+    st.radio("Open KPI page", list(kpi_vals.keys()), index=None, horizontal=True, key="kpi_open",
+             label_visibility="collapsed", on_change=_open_kpi_page)
 
     c0a, c0b = st.columns([1, 1])
     with c0a:
         st.markdown("#### Racks: Empty vs Full")
         # Use ALL rack locations (numeric or TUN) from master for total; occupancy from filtered inventory.
+        # Both inputs are already distinct (a set / the categories): count racks off the location flags
         try:
-            _s_master = pd.Series(list(master_locations), dtype=str)
-            _is_rack_master = _s_master.str.isnumeric() | _s_master.str.upper().str.startswith("TUN")
-            _total_rack_set = set(_s_master[_is_rack_master])
+            _f = MASTER_LOC_FLAGS
+            _total_racks = int((_f["numeric"] | _f["starts_tun"]).sum())
         except Exception:
-            _total_rack_set = set()
-        _s_occ = filtered_inventory_df["LocationName"].astype(str)
-        _is_rack_occ = _s_occ.str.isnumeric() | _s_occ.str.upper().str.startswith("TUN")
-        _occupied_rack_set = set(_s_occ[_is_rack_occ].unique())
-        _rack_full = int(len(_occupied_rack_set))
-        _rack_empty = int(max(0, len(_total_rack_set) - len(_occupied_rack_set)))
-        df_rack_ef = pd.DataFrame({"Status": ["Empty", "Full"], "Count": [_rack_empty, _rack_full]})
-        fig_rack_ef = px.pie(
-            df_rack_ef, values="Count", names="Status",
-            color="Status", color_discrete_map={"Empty": RED, "Full": BLUE}, hole=0.45
-        )
-        fig_rack_ef.update_layout(showlegend=True, height=320)
+            _total_racks = 0
+        # The filtered frame keeps only used categories, so its categories are the occupied locations
+        _f = _loc_flags(pd.Series(filtered_inventory_df["LocationName"].cat.categories.astype(str)))
+        _rack_full = int((_f["numeric"] | _f["starts_tun"]).sum())
+        _rack_empty = int(max(0, _total_racks - _rack_full))
+        fig_rack_ef = _pie_spec("Status", ("Empty", "Full"), (_rack_empty, _rack_full),
+                                (("Empty", RED), ("Full", BLUE)), 0.45, 320)
         st.plotly_chart(fig_rack_ef, use_container_width=True)
     with c0b:
         st.markdown("#### Bulk Floor: Used vs Empty Slots")
@@ -1331,10 +1821,8 @@ if selected_nav == "Dashboard":
         else:
             bulk_used  = int(bulk_locations_df["PalletCount"].sum())
             bulk_empty = int(bulk_locations_df["EmptySlots"].sum())
-            df_bulk_ue = pd.DataFrame({"Status": ["Used", "Empty"], "Count": [bulk_used, bulk_empty]})
-            fig_bulk_ue = px.pie(df_bulk_ue, values="Count", names="Status",
-                                 color="Status", color_discrete_map={"Empty": RED, "Used": BLUE}, hole=0.45)
-            fig_bulk_ue.update_layout(showlegend=True, height=320)
+            fig_bulk_ue = _pie_spec("Status", ("Used", "Empty"), (bulk_used, bulk_empty),
+                                    (("Empty", RED), ("Used", BLUE)), 0.45, 320)
             st.plotly_chart(fig_bulk_ue, use_container_width=True)
 
             # --- Bulk Zones Capacity (deterministic) ---
@@ -1342,55 +1830,27 @@ if selected_nav == "Dashboard":
             if bulk_locations_df is None or bulk_locations_df.empty:
                 st.info("No bulk locations in current data.")
             else:
-                by_zone = bulk_locations_df.groupby("Zone").agg(
+                by_zone = bulk_locations_df.groupby("Zone", observed=True).agg(
                     Occupied=("PalletCount", "sum"),
                     Empty=("EmptySlots", "sum"),
                     MaxAllowed=("MaxAllowed", "max"),
                     Locations=("LocationName", "count"),
                 ).reset_index()
                 by_zone["Capacity"] = by_zone["Occupied"] + by_zone["Empty"]
-                zmap = {}
-                for _idx, _row in by_zone.iterrows():
-                    zmap[str(_row["Zone"]).upper()] = (
-                        int(_row["Locations"]) if not pd.isna(_row["Locations"]) else None,
-                        int(_row["MaxAllowed"]) if not pd.isna(_row["MaxAllowed"]) else None,
-                    )
-                # A = 52 * 5 = 260
-                _a = by_zone.index[by_zone["Zone"].astype(str).str.upper()=="A"]
-                if len(_a) > 0:
-                    i = int(_a[0])
-                    by_zone.loc[i, "Capacity"] = 260
-                    by_zone.loc[i, "Empty"] = max(0, int(by_zone.loc[i, "Capacity"]) - int(by_zone.loc[i, "Occupied"]))
-                # B, D, F, H, I = 62 * 4 = 248
-                for _z in ['B','D','F','H','I']:
-                    _idxs = by_zone.index[by_zone["Zone"].astype(str).str.upper()==_z]
-                    if len(_idxs) > 0:
-                        j = int(_idxs[0])
-                        by_zone.loc[j, "Capacity"] = 248
-                        by_zone.loc[j, "Empty"] = max(0, int(by_zone.loc[j, "Capacity"]) - int(by_zone.loc[j, "Occupied"]))
-                # G = 56 * MaxAllowed(G) (from Config bulk_rules)
-                _g = by_zone.index[by_zone["Zone"].astype(str).str.upper()=="G"]
-                if len(_g) > 0:
-                    g = int(_g[0])
-                    maxg = int(by_zone.loc[g, "MaxAllowed"]) if pd.notna(by_zone.loc[g, "MaxAllowed"]) else None
-                    if maxg is not None:
-                        by_zone.loc[g, "Capacity"] = 56 * maxg
-                        by_zone.loc[g, "Empty"] = max(0, int(by_zone.loc[g, "Capacity"]) - int(by_zone.loc[g, "Occupied"]))
-                # Others: if known, Capacity = Locations * MaxAllowed
-                for _idx, _row in by_zone.iterrows():
-                    _zone = str(_row["Zone"]).upper()
-                    if _zone not in ['A','B','D','F','H','I','G']:
-                        _locs, _mx = zmap.get(_zone, (None, None))
-                        if _locs is not None and _mx is not None:
-                            by_zone.loc[_idx, "Capacity"] = int(_locs) * int(_mx)
-                            by_zone.loc[_idx, "Empty"] = max(0, int(by_zone.loc[_idx, "Capacity"]) - int(by_zone.loc[_idx, "Occupied"]))
-                df_zone_melt = by_zone.melt(id_vars="Zone", value_vars=["Occupied","Empty","Capacity"],
-                                            var_name="Metric", value_name="Count")
-                fig_zone = px.bar(
-                    df_zone_melt, x="Zone", y="Count", color="Metric", barmode="group",
-                    color_discrete_map={"Occupied": BLUE, "Empty": RED, "Capacity": "#888888"}
-                )
-                fig_zone.update_layout(height=360, xaxis_title="Bulk Zone", yaxis_title="Count")
+                # Capacity rules, all zones at once:
+                #   A = 52 * 5 = 260; B, D, F, H, I = 62 * 4 = 248; G = 56 * MaxAllowed(G) (from Config bulk_rules);
+                #   others: Locations * MaxAllowed. Zones whose rule can't be computed keep Occupied + Empty.
+                _zone = by_zone["Zone"].astype(str).str.upper().to_numpy()
+                _mx = by_zone["MaxAllowed"].to_numpy(dtype=float)
+                _cap = np.select([_zone == "A", np.isin(_zone, ["B", "D", "F", "H", "I"]), _zone == "G"],
+                                 [260.0, 248.0, 56 * _mx], default=by_zone["Locations"].to_numpy(dtype=float) * _mx)
+                _known = ~np.isnan(_cap)
+                _occ = by_zone["Occupied"].to_numpy()
+                by_zone["Capacity"] = np.where(_known, np.nan_to_num(_cap), by_zone["Capacity"]).astype(by_zone["Capacity"].dtype)
+                by_zone["Empty"] = np.where(_known, np.maximum(0, by_zone["Capacity"] - _occ), by_zone["Empty"]).astype(by_zone["Empty"].dtype)
+                fig_zone = _zone_bar_spec(tuple(
+                    (str(z), int(o), int(e), int(c))
+                    for z, o, e, c in by_zone[["Zone", "Occupied", "Empty", "Capacity"]].itertuples(index=False)))
                 st.plotly_chart(fig_zone, use_container_width=True)
             # --- END Bulk Zones Capacity ---
 
@@ -1398,42 +1858,17 @@ if selected_nav == "Dashboard":
     cA, cB = st.columns([1, 1])
     with cA:
         st.markdown("#### Inventory Composition")
-        s_all = inventory_df["LocationName"].astype(str)
-        is_rack = s_all.str.isnumeric()
-        is_bulk = s_all.str[0].str.upper().isin(bulk_rules.keys())
-        is_special = s_all.str.upper().isin(["DAMAGE", "IBDAMAGE", "MISSING"])
-        comp = pd.DataFrame({"Category": ["Rack", "Bulk", "Special"],
-                             "Count": [int(is_rack.sum()), int(is_bulk.sum()), int(is_special.sum())]})
-        fig_comp = px.pie(comp, values="Count", names="Category",
-                          color="Category", color_discrete_map={"Rack": BLUE, "Bulk": "#2ca02c", "Special": RED}, hole=0.35)
-        fig_comp.update_layout(showlegend=True, height=340)
+        # Plain numpy bool masks from the location categories (no per-row string ops on the full frame)
+        is_rack = _category_mask(inventory_df["LocationName"], lambda v: v.str.isnumeric())
+        is_bulk = _category_mask(inventory_df["LocationName"], lambda v: v.str[0].str.upper().isin(bulk_rules.keys()))
+        is_special = is_damage_loc | is_missing_loc
+        fig_comp = _pie_spec("Category", ("Rack", "Bulk", "Special"),
+                             (int(is_rack.sum()), int(is_bulk.sum()), int(is_special.sum())),
+                             (("Rack", BLUE), ("Bulk", "#2ca02c"), ("Special", RED)), 0.35, 340)
         st.plotly_chart(fig_comp, use_container_width=True)
     with cB:
         pass  # auto-healed empty with-body
-    st.markdown("### 🔎 Search Center")
-    sc1, sc2, sc3, sc4 = st.columns(4)
-    with sc1:
-        q_loc = st.text_input("Location contains", value=st.session_state.filters.get("LocationName", ""))
-    with sc2:
-        q_pid = st.text_input("Pallet ID contains", value=st.session_state.filters.get("PalletId", ""))
-    with sc3:
-        q_sku = st.text_input("SKU contains", value=st.session_state.filters.get("WarehouseSku", ""))
-    with sc4:
-        q_lot = st.text_input("LOT Number contains (numbers only)", value=st.session_state.filters.get("CustomerLotReference", ""))
-    if any([q_loc, q_pid, q_sku, q_lot]):
-        base = ensure_core(filtered_inventory_df)
-        df_show = base.copy()
-        if q_loc:
-            df_show = df_show[df_show["LocationName"].astype(str).str.contains(q_loc, case=False, na=False)]
-        if q_pid:
-            df_show = df_show[df_show["PalletId"].astype(str).str.contains(q_pid, case=False, na=False)]
-        if q_sku:
-            df_show = df_show[df_show["WarehouseSku"].astype(str).str.contains(q_sku, case=False, na=False)]
-        if q_lot:
-            q_lot_norm = normalize_lot_number(q_lot)
-            df_show = df_show[df_show["CustomerLotReference"].astype(str).str.contains(q_lot_norm, case=False, na=False)]
-        st.caption("Results")
-        render_lazy_df(maybe_limit(df_show), key="search_center", use_core=False)
+    _render_search_center()
     with st.expander("🕘 Recent Actions (last 20)"):
         log_df = read_action_log()
         if log_df.empty:
@@ -1454,65 +1889,68 @@ elif selected_nav == "Empty Partial Bins":
 
 elif selected_nav == "Partial Bins":
     st.subheader("Partial Bins")
-    render_lazy_df(ensure_core(partial_bins_df), key="partial_bins")
+    render_lazy_df(partial_bins_df, key="partial_bins", use_core=True)
 
 elif selected_nav == "Full Pallet Bins":
     st.subheader("Full Pallet Bins")
-    render_lazy_df(ensure_core(full_pallet_bins_df), key="full_bins")
+    render_lazy_df(full_pallet_bins_df, key="full_bins", use_core=True)
 
 elif selected_nav == "Damages":
     st.subheader("Damaged Pallets")
-    render_lazy_df(ensure_core(damages_df), key="damages")
+    render_lazy_df(damages_df, key="damages", use_core=True)
 
 elif selected_nav == "Missing":
     st.subheader("Missing Pallets")
-    render_lazy_df(ensure_core(missing_df), key="missing")
+    render_lazy_df(missing_df, key="missing", use_core=True)
 
 elif selected_nav == "Discrepancies (All)":
     st.subheader("🛠️ Discrepancies — All")
     with st.expander("Fix Log (All)"):
         download_fix_log_button(where_key="all_fixlog")
-    t1, t2, t3 = st.tabs(["Rack", "Bulk", "Duplicate"])
+    # st.tabs runs every tab body on each rerun; a radio picks one section so only that one is built
+    disc_tab = st.radio("Discrepancy type", ["Rack", "Bulk", "Duplicate"], horizontal=True,
+                        key="disc_all_tab", label_visibility="collapsed")
     # --- Rack tab ---
-    with t1:
+    if disc_tab == "Rack":
         st.subheader("Rack Discrepancies")
         if not discrepancy_df.empty:
-            lots = ["(All)"] + sorted([_lot_to_str(x) for x in discrepancy_df["CustomerLotReference"].dropna().unique() if _lot_to_str(x)])
+            lots = ["(All)"] + _cached_lot_options(_data_key(), "rack", discrepancy_df["CustomerLotReference"])
             sel_lot = st.selectbox("Filter by LOT", lots, index=0, key="rack_all_lot_filter",
                 help="Only non-empty LOTs are shown. Use (All) to see every row.")
-            filt = discrepancy_df if sel_lot == "(All)" else discrepancy_df[discrepancy_df["CustomerLotReference"].map(_lot_to_str) == sel_lot]
+            filt = discrepancy_df if sel_lot == "(All)" else _take(discrepancy_df, _lot_eq_mask(discrepancy_df["CustomerLotReference"], sel_lot))
             with st.expander("▶ Multi‑Pallet Summary (by Location)"):
                 if "Issue" in filt.columns:
-                    mp_only = filt[filt["Issue"].isin(["Multiple pallets in rack location", "Multiple pallets in partial bin"])]
+                    mp_only = filt.loc[filt["Issue"].isin(["Multiple pallets in rack location", "Multiple pallets in partial bin"]),
+                                       ["LocationName", "PalletId"]]
                 else:
                     mp_only = pd.DataFrame()
                 if not mp_only.empty:
                     summary_cnt = (
-                        mp_only.groupby("LocationName")["PalletId"].nunique(dropna=True)
-                        .reset_index(name="DistinctPallets").sort_values("DistinctPallets", ascending=False)
-                    )
-                    all_ids = (
-                        mp_only.groupby("LocationName")["PalletId"]
-                        .apply(lambda s: ", ".join(sorted({normalize_pallet_id(x) for x in s if normalize_pallet_id(x)})))
-                        .reset_index(name="AllPalletIDs")
+                        _distinct_count(mp_only, "LocationName", "PalletId", "DistinctPallets")
+                        .sort_values("DistinctPallets", ascending=False)
                     )
-                    mp_summary_tbl = summary_cnt.merge(all_ids, on="LocationName", how="left")
+                    # Distinct non-blank IDs per location, sorted once up-front and joined per group in C
+                    ids = mp_only.assign(PalletId=normalize_pallet_series(mp_only["PalletId"]))
+                    ids = ids[ids["PalletId"] != ""].drop_duplicates().sort_values("PalletId")
+                    all_ids = ids.groupby("LocationName", observed=True)["PalletId"].agg(", ".join).rename("AllPalletIDs")
+                    # all_ids is already indexed by LocationName: join on it rather than merging
+                    mp_summary_tbl = summary_cnt.join(all_ids, on="LocationName").reset_index(drop=True)
+                    mp_summary_tbl["AllPalletIDs"] = mp_summary_tbl["AllPalletIDs"].fillna("")
                     render_lazy_df(mp_summary_tbl, key="rack_all_mp_summary")
                 else:
                     st.info("No multi‑pallet rack locations in the current filter.")
             rack_display = ensure_core(filt, include_issue=True)
             render_lazy_df(rack_display, key="rack_all_disc_table")
-            st.download_button("Download Rack Discrepancies CSV", discrepancy_df.to_csv(index=False).encode("utf-8"),
+            st.download_button("Download Rack Discrepancies CSV", _csv_bytes(_data_key(), "rack", discrepancy_df),
                                "rack_discrepancies.csv", "text/csv", key="rack_all_dl_rack")
             st.markdown("### ✅ Fix discrepancy by LOT")
-            reasons = ["Relocated", "Consolidated", "Data correction", "Damaged pull-down", "Other"]
-            lot_choices = sorted({_lot_to_str(x) for x in discrepancy_df["CustomerLotReference"].dropna().unique() if _lot_to_str(x)})
+            lot_choices = _cached_lot_options(_data_key(), "rack", discrepancy_df["CustomerLotReference"])
             if lot_choices:
                 chosen_lot = st.selectbox("Select LOT to fix", lot_choices, key="rack_all_fix_lot")
-                reason = st.selectbox("Reason", reasons, index=0, key="rack_all_fix_reason")
+                reason = st.selectbox("Reason", FIX_REASONS, index=0, key="rack_all_fix_reason")
                 note = st.text_input(f"Add note for LOT {chosen_lot}", key="rack_all_fix_note")
                 if st.button("Fix Selected LOT", key="rack_all_fix_btn"):
-                    rows_to_fix = discrepancy_df[discrepancy_df["CustomerLotReference"].map(_lot_to_str) == chosen_lot]
+                    rows_to_fix = _take(discrepancy_df, _lot_eq_mask(discrepancy_df["CustomerLotReference"], chosen_lot))
                     batch_id, used_path = log_batch(rows_to_fix, note, chosen_lot, "Rack", action="RESOLVE", reason=reason)
                     st.success(f"Resolved {len(rows_to_fix)} rack discrepancy row(s) for LOT {chosen_lot}.")
                     st.caption(f"📝 Logged to: `{used_path}` • BatchId={batch_id}")
@@ -1528,11 +1966,10 @@ elif selected_nav == "Discrepancies (All)":
                         if not last_resolve.empty:
                             last_batch = last_resolve.sort_values("Timestamp").iloc[-1]["BatchId"]
                             rows = last_resolve[last_resolve["BatchId"] == last_batch]
-                            for _, r in rows.iterrows():
-                                ok, upath, err = log_action(r.to_dict(), f"UNDO of batch {last_batch}", r.get("SelectedLOT",""), "Rack", "UNDO", str(last_batch), reason="Undo")
-                                if not ok:
-                                    st.error(f"Failed to write UNDO action. {err}")
-                                    break
+                            ok, upath, err = log_actions(rows.to_dict("records"), f"UNDO of batch {last_batch}", "Rack", "UNDO",
+                                                         str(last_batch), reason="Undo")
+                            if not ok:
+                                st.error(f"Failed to write UNDO action. {err}")
                             st.success(f"UNDO recorded for batch {last_batch} ({len(rows)} row(s)).")
                         else:
                             st.info("No RESOLVE actions to undo for Rack.")
@@ -1544,17 +1981,19 @@ elif selected_nav == "Discrepancies (All)":
             st.info("No rack discrepancies found.")
 
     # --- Bulk tab ---
-    with t2:
+    elif disc_tab == "Bulk":
         st.subheader("Bulk Discrepancies")
         if not bulk_df.empty:
-            lots = ["(All)"] + sorted([_lot_to_str(x) for x in bulk_df["CustomerLotReference"].dropna().unique() if _lot_to_str(x)])
+            lots = ["(All)"] + _cached_lot_options(_data_key(), "bulk", bulk_df["CustomerLotReference"])
             sel_lot = st.selectbox("Filter by LOT", lots, index=0, key="bulk_all_lot_filter",
                 help="Only non-empty LOTs are shown. Use (All) to see every row.")
-            filt = bulk_df if sel_lot == "(All)" else bulk_df[bulk_df["CustomerLotReference"].map(_lot_to_str) == sel_lot]
+            filt = bulk_df if sel_lot == "(All)" else _take(bulk_df, _lot_eq_mask(bulk_df["CustomerLotReference"], sel_lot))
             loc_search = st.text_input("Search location (optional)", value="", key="bulk_all_loc_search")
-            df2 = filt.copy()
+            # Project to the grid columns before filtering so the search/grid work on a narrow frame
+            show_cols = [c for c in BULK_GRID_COLS if c in filt.columns]
+            df2 = filt[show_cols]
             if loc_search.strip():
-                df2 = df2[df2["LocationName"].astype(str).str.contains(loc_search.strip(), case=False, na=False)]
+                df2 = df2[_contains_ci(df2["LocationName"], loc_search.strip())]
             st.markdown("#### Grouped by Location (AgGrid)")
             if not _AGGRID_AVAILABLE:
                 st.warning("`streamlit-aggrid` is not installed. Add `streamlit-aggrid==0.3.5` to requirements.txt.")
@@ -1562,44 +2001,18 @@ elif selected_nav == "Discrepancies (All)":
                 skel_ph = st.empty()
                 with skel_ph.container():
                     show_skeleton(8)
-                show_cols = [c for c in ["LocationName", "WarehouseSku", "CustomerLotReference", "PalletId", "Qty", "Issue"] if c in df2.columns]
-                grid_df = df2[show_cols].copy()
-                grid_df["CustomerLotReference"] = grid_df["CustomerLotReference"].apply(_lot_to_str)
+                grid_df = df2.assign(CustomerLotReference=normalize_lot_series(df2["CustomerLotReference"]))
                 quick_text = st.text_input("Quick filter (search all columns)", value="", key="bulk_all_aggrid_quickfilter")
                 expand_all = st.toggle("Expand all groups", value=False, key="bulk_all_expand_all")
-                gb = GridOptionsBuilder.from_dataframe(grid_df)
-                gb.configure_default_column(resizable=True, filter=True, sortable=True, floatingFilter=True)
-                gb.configure_column("LocationName", rowGroup=True, hide=True)
-                if "WarehouseSku" in grid_df.columns: gb.configure_column("WarehouseSku", pinned="left")
-                if "Qty" in grid_df.columns: gb.configure_column("Qty", pinned="right")
-                if "Issue" in grid_df.columns: gb.configure_column("Issue", cellStyle={"color": RED, "fontWeight": "bold"})
-                gb.configure_selection("multiple", use_checkbox=True, groupSelectsChildren=True, groupSelectsFiltered=True)
-                gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=100)
-                gb.configure_side_bar()
-                if "Qty" in grid_df.columns: gb.configure_column("Qty", aggFunc="sum")
-                if JsCode is not None:
-                    get_row_style = JsCode("""
-function(params) {
-  if (params.data && params.data.Issue && params.data.Issue.length > 0) {
-    return { 'background-color': '#fff0f0' };
-  }
-  return null;
-}
-""")
-                    gb.configure_grid_options(getRowStyle=get_row_style)
-                gb.configure_grid_options(groupDefaultExpanded=(-1 if expand_all else 0),
-                                          animateRows=True, enableRangeSelection=True,
-                                          suppressAggFuncInHeader=False, domLayout="normal")
-                grid_options = gb.build()
+                grid_options = _grid_options("bulk_disc", _grid_schema(grid_df), expand_all, grid_df)
                 grid_resp = AgGrid(grid_df, gridOptions=grid_options, update_mode=GridUpdateMode.SELECTION_CHANGED,
                                    allow_unsafe_jscode=True, fit_columns_on_grid_load=True, height=500,
-                                   theme="streamlit", quickFilterText=quick_text)
+                                   theme="streamlit", quickFilterText=quick_text, key="bulk_all_aggrid")
                 skel_ph.empty()
                 sel_rows = pd.DataFrame(grid_resp.get("selected_rows", []))
                 st.caption(f"Selected rows: {len(sel_rows)}")
                 with st.expander("Log Fix for selected rows"):
-                    reasons = ["Relocated", "Consolidated", "Data correction", "Damaged pull-down", "Other"]
-                    reason = st.selectbox("Reason", reasons, index=0, key="bulk_all_sel_reason")
+                    reason = st.selectbox("Reason", FIX_REASONS, index=0, key="bulk_all_sel_reason")
                     note = st.text_input("Note (optional)", value="", key="bulk_all_aggrid_note")
                     selected_lot_value = "(Multiple)"
                     if not sel_rows.empty and "CustomerLotReference" in sel_rows.columns:
@@ -1617,17 +2030,16 @@ function(params) {
             st.markdown("#### Flat view (all rows)")
             bulk_display = ensure_core(filt, include_issue=True)
             render_lazy_df(bulk_display, key="bulk_all_disc_flat")
-            st.download_button("Download Bulk Discrepancies CSV", bulk_df.to_csv(index=False).encode("utf-8"),
+            st.download_button("Download Bulk Discrepancies CSV", _csv_bytes(_data_key(), "bulk", bulk_df),
                                "bulk_discrepancies.csv", "text/csv", key="bulk_all_dl_bulk")
             st.markdown("### ✅ Fix discrepancy by LOT")
-            lot_choices = sorted({_lot_to_str(x) for x in bulk_df["CustomerLotReference"].dropna().unique() if _lot_to_str(x)})
-            reasons = ["Relocated", "Consolidated", "Data correction", "Damaged pull-down", "Other"]
+            lot_choices = _cached_lot_options(_data_key(), "bulk", bulk_df["CustomerLotReference"])
             if lot_choices:
                 chosen_lot = st.selectbox("Select LOT to fix", lot_choices, key="bulk_all_fix_lot")
-                reason = st.selectbox("Reason", reasons, index=0, key="bulk_all_fix_reason")
+                reason = st.selectbox("Reason", FIX_REASONS, index=0, key="bulk_all_fix_reason")
                 note = st.text_input(f"Add note for LOT {chosen_lot}", key="bulk_all_fix_note")
                 if st.button("Fix Selected LOT", key="bulk_all_fix_btn"):
-                    rows_to_fix = bulk_df[bulk_df["CustomerLotReference"].map(_lot_to_str) == chosen_lot]
+                    rows_to_fix = _take(bulk_df, _lot_eq_mask(bulk_df["CustomerLotReference"], chosen_lot))
                     batch_id, used_path = log_batch(rows_to_fix, note, chosen_lot, "Bulk", action="RESOLVE", reason=reason)
                     st.success(f"Resolved {len(rows_to_fix)} bulk discrepancy row(s) for LOT {chosen_lot}.")
                     st.caption(f"📝 Logged to: `{used_path}` • BatchId={batch_id}")
@@ -1639,21 +2051,20 @@ function(params) {
             st.info("No bulk discrepancies found.")
 
     # --- Duplicate tab ---
-    with t3:
+    elif disc_tab == "Duplicate":
         st.subheader("Duplicate Pallets (same Pallet ID in multiple locations)")
         if dups_summary_df.empty:
             st.success("No duplicate pallets found. ✅")
         else:
             st.write("Summary (PalletId with count of distinct locations):")
             render_lazy_df(dups_summary_df, key="dup_all_summary")
-            opt = ["(Select)"] + dups_summary_df["PalletId"].astype(str).tolist()
+            opt = _cached_dup_options(_data_key(), dups_summary_df["PalletId"])
             sel_pid_norm = st.selectbox("Choose a duplicate Pallet ID", opt, index=0, key="dup_all_sel")
             if sel_pid_norm != "(Select)":
-                det = dups_detail_df[dups_detail_df["PalletId"].astype(str).str.strip().str.upper() == sel_pid_norm]
+                det = dup_detail_rows(sel_pid_norm)
                 render_lazy_df(det.sort_values("LocationName"), key="dup_all_detail")
                 with st.expander("Log Fix for this Pallet ID"):
-                    reasons = ["Relocated", "Consolidated", "Data correction", "Damaged pull-down", "Other"]
-                    reason = st.selectbox("Reason", reasons, index=0, key="dup_all_fix_reason")
+                    reason = st.selectbox("Reason", FIX_REASONS, index=0, key="dup_all_fix_reason")
                     note = st.text_input("Note (optional)", key="dup_all_fix_note")
                     if st.button("Log Fix for this Pallet ID", key="dup_all_fix_btn"):
                         batch_id, used_path = log_batch(det, note, selected_lot="", discrepancy_type="Duplicate", action="RESOLVE", reason=reason)
@@ -1689,9 +2100,9 @@ elif selected_nav == "Bulk Locations":
     search = st.text_input("Search location (optional)", value=st.session_state.get("bulk_loc_search2", ""), key="bulk_loc_search2")
 
     # Build parent location view
-    parent_df = bulk_locations_df.copy()
+    parent_df = bulk_locations_df
     if not parent_df.empty and search.strip():
-        parent_df = parent_df[parent_df["LocationName"].astype(str).str.contains(search.strip(), case=False, na=False)]
+        parent_df = parent_df[_contains_ci(parent_df["LocationName"], search.strip())]
 
     if not parent_df.empty:
         over_mask = parent_df["PalletCount"] > parent_df["MaxAllowed"]
@@ -1706,8 +2117,8 @@ elif selected_nav == "Bulk Locations":
         rows = LOC_INDEX.get(loc, pd.DataFrame())
         if rows.empty:
             st.warning(f"No pallets found for location {loc}."); return
-        labels, label_to_key, full_df = PALLET_LABELS_BY_LOC.get(loc, ([], {}, rows))
-        # choices sorted by Qty ascending already in _mk_pallet_labels; add "(All)" on top
+        labels, full_df = PALLET_LABELS_BY_LOC.get(loc, ([], rows))
+        # choices sorted by Qty ascending (then Pallet ID) already in _mk_pallet_labels_by_loc; add "(All)" on top
         choices = ["(All)"] + labels
         default_index = 0
         if preselect_pallet:
@@ -1718,35 +2129,21 @@ elif selected_nav == "Bulk Locations":
         if selected_label == "(All)":
             show_df = full_df
         else:
-            chosen_key = label_to_key.get(selected_label, None)
+            chosen_key = PALLET_KEY_BY_LABEL.get((loc, selected_label), None)
             show_df = full_df if chosen_key is None else full_df[full_df["_PID_KEY"] == chosen_key]
         # Always show core columns (includes Qty) below
-        render_lazy_df(ensure_core(show_df), key=f"bulk_loc_rows_{loc}")
+        render_lazy_df(show_df, key=f"bulk_loc_rows_{loc}", use_core=True)
 
     if ui_mode == "Grid (select a location)" and _AGGRID_AVAILABLE and not parent_df.empty:
         skel_ph = st.empty()
         with skel_ph.container():
             show_skeleton(8)
         show_cols = ["LocationName", "Zone", "PalletCount", "MaxAllowed", "EmptySlots"]
-        grid_df = parent_df[show_cols].copy()
-        gb = GridOptionsBuilder.from_dataframe(grid_df)
-        gb.configure_default_column(resizable=True, filter=True, sortable=True, floatingFilter=True)
-        if JsCode is not None:
-            get_row_class = JsCode("""
-function(params) {
-  if (params.data && (params.data.PalletCount > params.data.MaxAllowed)) {
-    return 'overCapRow';
-  }
-  return null;
-}
-""")
-            gb.configure_grid_options(getRowClass=get_row_class)
-        gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=50)
-        gb.configure_side_bar()
-        gb.configure_selection("single", use_checkbox=True)
-        grid_options = gb.build()
+        grid_df = parent_df[show_cols]
+        grid_options = _grid_options("bulk_locations", _grid_schema(grid_df), False, grid_df)
         grid_resp = AgGrid(grid_df, gridOptions=grid_options, update_mode=GridUpdateMode.SELECTION_CHANGED,
-                           allow_unsafe_jscode=True, fit_columns_on_grid_load=True, height=540, theme="streamlit")
+                           allow_unsafe_jscode=True, fit_columns_on_grid_load=True, height=540, theme="streamlit",
+                           key="bulk_locations_aggrid")
         skel_ph.empty()
         sel_rows = pd.DataFrame(grid_resp.get("selected_rows", []))
         if not sel_rows.empty:
@@ -1759,30 +2156,32 @@ function(params) {
     elif ui_mode == "Flat Pallet List (Bulk)":
         # NEW: Global flat list of bulk pallets with Qty header and sorting
         st.markdown("#### Flat Pallet List (Bulk)")
-        base = ensure_core(filtered_inventory_df)
-        # Filter rows where the location's first character is a bulk zone letter
-        is_bulk_row = base["LocationName"].astype(str).str[0].str.upper().isin(bulk_rules.keys())
-        bulk_flat = base[is_bulk_row].copy()
+        base = CORE_INVENTORY_DF
+        # Rows where the location's first character is a bulk zone letter (tested once per location)
+        mask = _category_mask(base["LocationName"], lambda v: v.str[0].str.upper().isin(bulk_rules.keys()))
         only_low = st.toggle("Only show Qty ≤ 5", value=True, key="bulk_flat_lowqty")
+        # Qty is already numeric (NaN -> 0) from the loader: compare the raw array, no to_numeric copy
         if only_low:
-            bulk_flat = bulk_flat[pd.to_numeric(bulk_flat["Qty"], errors="coerce").fillna(0) <= 5]
+            mask &= base["Qty"].to_numpy() <= 5
         # Optional search
         colA, colB, colC, colD = st.columns(4)
         with colA: f_loc = st.text_input("Filter: Location", "")
         with colB: f_pid = st.text_input("Filter: Pallet ID", "")
         with colC: f_sku = st.text_input("Filter: SKU", "")
         with colD: f_lot = st.text_input("Filter: LOT", "")
-        if f_loc: bulk_flat = bulk_flat[bulk_flat["LocationName"].astype(str).str.contains(f_loc, case=False, na=False)]
-        if f_pid: bulk_flat = bulk_flat[bulk_flat["PalletId"].astype(str).str.contains(f_pid, case=False, na=False)]
-        if f_sku: bulk_flat = bulk_flat[bulk_flat["WarehouseSku"].astype(str).str.contains(f_sku, case=False, na=False)]
+        # AND every filter into one mask and slice once (as in the Search Center)
+        if f_loc: mask &= _contains_ci(base["LocationName"], f_loc)
+        if f_pid: mask &= _core_pid_contains(f_pid)
+        if f_sku: mask &= _contains_ci(base["WarehouseSku"], f_sku)
         if f_lot:
             lot_norm = normalize_lot_number(f_lot)
-            bulk_flat = bulk_flat[bulk_flat["CustomerLotReference"].astype(str).str.contains(lot_norm, case=False, na=False)]
+            mask &= _contains_ci(base["CustomerLotReference"], lot_norm)
+        bulk_flat = base.iloc[np.flatnonzero(mask)]
         # Sort by Qty ascending so lowest QTYs appear first
-        bulk_flat["Qty_num"] = pd.to_numeric(bulk_flat["Qty"], errors="coerce").fillna(0)
-        bulk_flat = bulk_flat.sort_values("Qty_num", ascending=True).drop(columns=["Qty_num"])
+        bulk_flat = bulk_flat.sort_values("Qty", ascending=True)
         render_lazy_df(bulk_flat, key="bulk_flat_all", use_core=False, page_size=500)
-        st.download_button("Download (Bulk Flat Pallets CSV)", bulk_flat.to_csv(index=False).encode("utf-8"),
+        flat_view = f"bulk_flat|{only_low}|{f_loc}|{f_pid}|{f_sku}|{f_lot}"
+        st.download_button("Download (Bulk Flat Pallets CSV)", _csv_bytes(_data_key(), flat_view, bulk_flat),
                            "bulk_pallets_flat.csv", "text/csv")
         # Jump intent preview (optional)
         if jump.get("type") in ("pallet", "location") and jump.get("location"):
@@ -1795,13 +2194,19 @@ function(params) {
             st.info("No bulk locations found.")
         else:
             df_show = parent_df.sort_values(["Zone", "LocationName"])
-            for _, r in df_show.iterrows():
-                loc = str(r["LocationName"])
-                over_by = int(r["PalletCount"] - r["MaxAllowed"])
+            for r in df_show[["LocationName", "PalletCount", "MaxAllowed", "EmptySlots"]].itertuples(index=False):
+                loc = str(r.LocationName)
+                over_by = int(r.PalletCount - r.MaxAllowed)
                 over_badge = f' <span style="color:#b00020;font-weight:700;">✗ OVER {over_by}</span>' if over_by > 0 else ""
-                header = f"{loc} — {int(r['PalletCount'])}/{int(r['MaxAllowed'])} (Empty {int(r['EmptySlots'])}){over_badge}"
-                with st.expander(header, expanded=False):
-                    _render_location_detail(loc, key_prefix="exp_")
+                header = f"{loc} — {int(r.PalletCount)}/{int(r.MaxAllowed)} (Empty {int(r.EmptySlots)}){over_badge}"
+                # Build a location's detail only while its expander is open (needs expander on_change/.open)
+                try:
+                    exp = st.expander(header, expanded=False, key=f"exp_open_{loc}", on_change="rerun")
+                except TypeError:
+                    exp = st.expander(header, expanded=False)
+                with exp:
+                    if getattr(exp, "open", True):
+                        _render_location_detail(loc, key_prefix="exp_")
         if jump.get("type") in ("pallet", "location") and jump.get("location"):
             st.markdown("#### Jump Result")
             _render_location_detail(jump["location"], preselect_pallet=jump.get("pallet_id"), key_prefix="jump2_")
@@ -1850,8 +2255,7 @@ elif selected_nav == "Trends":
             kpi_cols = ["EmptyBins","EmptyPartialBins","PartialBins","FullPalletBins","Damages","Missing"]
             ok_cols = [c for c in kpi_cols if c in hist.columns]
             if ok_cols:
-                kpi_df = hist[["Timestamp"] + ok_cols].copy()
-                kpi_melt = kpi_df.melt(id_vars="Timestamp", value_vars=ok_cols,
+                kpi_melt = hist.melt(id_vars="Timestamp", value_vars=ok_cols,
                                        var_name="Metric", value_name="Value")
                 try:
                     kpi_melt["Value"] = pd.to_numeric(kpi_melt["Value"], errors="coerce").fillna(0)
@@ -1876,9 +2280,7 @@ elif selected_nav == "Trends":
 
             # ----- Snapshots per day (bar) -----
             try:
-                per_day = hist.copy()
-                per_day["Day"] = per_day["Timestamp"].dt.date
-                snap_ct = per_day.groupby("Day").size().reset_index(name="Snapshots")
+                snap_ct = hist.groupby(hist["Timestamp"].dt.date.rename("Day"), observed=True).size().reset_index(name="Snapshots")
                 fig_ct = px.bar(snap_ct, x="Day", y="Snapshots", title="Snapshots per Day",
                                 labels={"Day":"Day","Snapshots":"Count"},
                                 color="Snapshots", color_continuous_scale="Blues")
@@ -1920,7 +2322,7 @@ elif selected_nav == "Self-Test":
         st.write("LOC_INDEX locations:", len(LOC_INDEX))
         if PALLET_LABELS_BY_LOC:
             any_loc = next(iter(PALLET_LABELS_BY_LOC))
-            labels, _, _ = PALLET_LABELS_BY_LOC[any_loc]
+            labels, _ = PALLET_LABELS_BY_LOC[any_loc]
             st.write(f"Sample location: {any_loc} (pallet choices: {len(labels)})")
         st.markdown("**Inventory summary**")
         st.write("- Rows:", len(inventory_df))
@@ -1938,8 +2340,9 @@ elif selected_nav == "Self-Test":
             count_alpha = int(has_letters.sum())
             st.write(f"- Pallet IDs with letters: **{count_alpha}**")
             if count_alpha > 0:
-                sample_alpha = inventory_df[has_letters][["LocationName", "PalletId", "WarehouseSku", "CustomerLotReference"]].head(25)
-                render_lazy_df(ensure_core(sample_alpha), key="pallet_alpha_sample")
+                sample_rows = np.flatnonzero(has_letters.to_numpy())[:25]
+                sample_alpha = inventory_df[["LocationName", "PalletId", "WarehouseSku", "CustomerLotReference"]].iloc[sample_rows]
+                render_lazy_df(sample_alpha, key="pallet_alpha_sample", use_core=True)
         except Exception:
             st.info("Pallet ID audit skipped (no PalletId column or parsing error).")
         st.markdown("— — —")